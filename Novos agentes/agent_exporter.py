@@ -1,16 +1,160 @@
+import abc
 import os
-from github import Github
+import base64
+import csv
+import hashlib
+import mimetypes
 from dotenv import load_dotenv
+# PyGithub and googleapiclient are imported inside the upload methods: local-only runs never load them
+import drive_client
 
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-import os
+# Resumable upload chunk size (overridable via DRIVE_UPLOAD_CHUNK_SIZE); Drive wants multiples of 256 KB
+UPLOAD_CHUNK_ALIGN = 256 * 1024
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Report formats mimetypes doesn't know about
+REPORT_MIME_TYPES = {
+    '.csv': 'text/csv',
+    '.parquet': 'application/vnd.apache.parquet',
+    '.arrow': 'application/vnd.apache.arrow.file',
+    '.feather': 'application/vnd.apache.arrow.file',
+    '.json': 'application/json',
+}
+
+# Default number of rows buffered before a batch is written (overridable via REPORT_BATCH_SIZE)
+DEFAULT_BATCH_SIZE = 5000
+
+class ReportWriter(abc.ABC):
+    """
+    Incremental report writer: rows are buffered and written in batches, so a report never has to be
+    materialised as a full list or DataFrame. Text columns are kept as strings, every other column is float64.
+    """
+    def __init__(self, filename, columns, text_columns=None, batch_size=None):
+        self.filename = filename
+        self.columns = list(columns)
+        # By default only the first (file name) column is text
+        self.text_columns = set(text_columns) if text_columns is not None else {self.columns[0]}
+        self.batch_size = batch_size or int(os.getenv("REPORT_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        self.rows_written = 0
+        self._batch = []
+
+    def write_rows(self, rows):
+        """Buffers row dicts and writes a batch every batch_size rows."""
+        for row in rows:
+            self._batch.append(row)
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Writes any buffered rows."""
+        if self._batch:
+            self._write_batch(self._batch)
+            self.rows_written += len(self._batch)
+            self._batch = []
+
+    def close(self):
+        """Flushes and closes the output. Returns the filename, or None if no rows were written."""
+        self.flush()
+        self._close()
+        return self.filename if self.rows_written else None
+
+    def _typed_value(self, col, value):
+        # Same values as the DataFrame export after fillna(0): missing numbers become 0.0
+        if col in self.text_columns:
+            return None if value is None else str(value)
+        return 0.0 if value is None else float(value)
+
+    @abc.abstractmethod
+    def _write_batch(self, batch):
+        """Writes a list of row dicts to the output."""
+
+    @abc.abstractmethod
+    def _close(self):
+        """Finishes and closes the output (called once, after the last flush)."""
+
+class CsvReportWriter(ReportWriter):
+    """Appends report rows to a CSV file. The file (and header) is only created once there is a row."""
+    def __init__(self, filename, columns, text_columns=None, batch_size=None):
+        super().__init__(filename, columns, text_columns, batch_size)
+        self._file = None
+        self._writer = None
+
+    def _write_batch(self, batch):
+        if self._writer is None:
+            self._file = open(self.filename, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.columns)
+        self._writer.writerows(
+            [self._typed_value(col, row.get(col)) for col in self.columns] for row in batch
+        )
+        self._file.flush()
+
+    def _close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+class ArrowReportWriter(ReportWriter):
+    """Columnar report writer: Parquet (one row group per batch) or Arrow IPC (one record batch per batch)."""
+    def __init__(self, filename, columns, text_columns=None, batch_size=None, file_format="parquet"):
+        super().__init__(filename, columns, text_columns, batch_size)
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("Parquet/Arrow export requires pyarrow (pip install pyarrow).")
+        self._pa = pyarrow
+        self.file_format = file_format
+        self.schema = pyarrow.schema([
+            (col, pyarrow.string() if col in self.text_columns else pyarrow.float64())
+            for col in self.columns
+        ])
+        self._writer = None
 
-# Scopes must match Reader to share token or be consistent
-SCOPES = ["https://www.googleapis.com/auth/drive"]
+    def _write_batch(self, batch):
+        pa = self._pa
+        arrays = [
+            pa.array([self._typed_value(field.name, row.get(field.name)) for row in batch], type=field.type)
+            for field in self.schema
+        ]
+        record_batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+        if self._writer is None:
+            if self.file_format == "parquet":
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.filename, self.schema)
+            else:
+                self._writer = pa.ipc.new_file(self.filename, self.schema)
+
+        if self.file_format == "parquet":
+            self._writer.write_table(pa.Table.from_batches([record_batch]))
+        else:
+            self._writer.write_batch(record_batch)
+
+    def _close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+def iter_report_rows(file_path, batch_size=DEFAULT_BATCH_SIZE):
+    """Yields row dicts from a CSV, Parquet or Arrow IPC report without loading it whole."""
+    lower_path = file_path.lower()
+    if lower_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for record_batch in pq.ParquetFile(file_path).iter_batches(batch_size=batch_size):
+            yield from record_batch.to_pylist()
+    elif lower_path.endswith((".arrow", ".feather")):
+        import pyarrow as pa
+        with pa.memory_map(file_path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield from reader.get_batch(i).to_pylist()
+    else:
+        with open(file_path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+def git_blob_sha(content):
+    """SHA-1 git assigns to a blob with this content (what GitHub reports as a file's 'sha')."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
 
 class ExporterAgent:
     def __init__(self):
@@ -22,26 +166,9 @@ class ExporterAgent:
         self.drive_service = None
 
     def _authenticate_drive(self):
-        """Authenticates with Google Drive for verify/upload."""
-        from google.oauth2 import service_account
-        creds = None
-        
-        # 1. Try Service Account
-        if os.path.exists('service_account.json'):
-             try:
-                 creds = service_account.Credentials.from_service_account_file(
-                    'service_account.json', scopes=SCOPES)
-             except Exception as e:
-                 print(f"Exporter Alert: Service Account error: {e}")
-
-        # 2. Try User Token
-        if not creds and os.path.exists("token.json"):
-            creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-        
-        # Refresh logic handling both types if needed, though Service Account handles itself mostly?
-        # Creating service
+        """Returns the Drive service, shared with the Reader Agent (authenticated once per process)."""
         try:
-            self.drive_service = build("drive", "v3", credentials=creds)
+            self.drive_service = drive_client.get_service()
             return self.drive_service
         except Exception as e:
             print(f"Exporter Drive Auth Error: {e}")
@@ -53,6 +180,7 @@ class ExporterAgent:
             return
 
         try:
+            from github import Github
             self.github_client = Github(self.github_token)
             self.repo = self.github_client.get_user().get_repo(self.repo_name.split("/")[-1])
             print(f"Exporter Agent: Connected to GitHub repo {self.repo_name}")
@@ -69,41 +197,197 @@ class ExporterAgent:
         print(f"Exporter Agent: Saved locally to {filename}")
         return filename
 
-    def upload_to_drive(self, file_path, folder_id=None):
-        """Uploads a file to Google Drive."""
+    def open_report_writer(self, filename="output.csv", columns=None, text_columns=None, batch_size=None):
+        """Returns an incremental writer for the report; the format follows the extension (.csv, .parquet, .arrow)."""
+        if columns is None:
+            from agent_organizer import EXPECTED_COLS
+            columns = EXPECTED_COLS
+
+        lower_name = filename.lower()
+        if lower_name.endswith(".parquet"):
+            return ArrowReportWriter(filename, columns, text_columns, batch_size, file_format="parquet")
+        if lower_name.endswith((".arrow", ".feather")):
+            return ArrowReportWriter(filename, columns, text_columns, batch_size, file_format="arrow")
+        return CsvReportWriter(filename, columns, text_columns, batch_size)
+
+    def export_dataframe(self, dataframe, filename="output.csv"):
+        """Exports a DataFrame in the format given by the filename's extension, one batch at a time."""
+        if not filename.lower().endswith((".parquet", ".arrow", ".feather")):
+            return self.export_to_csv(dataframe, filename)
+
+        if dataframe.empty:
+            print("Exporter Agent: DataFrame is empty, skipping export.")
+            return None
+
+        writer = self.open_report_writer(filename, columns=list(dataframe.columns))
+        for start in range(0, len(dataframe), writer.batch_size):
+            writer.write_rows(dataframe.iloc[start:start + writer.batch_size].to_dict("records"))
+        writer.close()
+        print(f"Exporter Agent: Saved locally to {filename}")
+        return filename
+
+    def convert_report(self, source_path, dest_path):
+        """Re-writes a report in another format (by extension), streaming it batch by batch."""
+        rows = iter_report_rows(source_path)
+        first = next(rows, None)
+        if first is None:
+            return None
+
+        writer = self.open_report_writer(dest_path, columns=list(first.keys()))
+        writer.write_rows([first])
+        writer.write_rows(rows)
+        return writer.close()
+
+    def upload_to_drive(self, file_path, folder_id=None, mimetype=None, chunk_size=None, retries=None, update_existing=None):
+        """
+        Uploads a file to Google Drive as a resumable, chunked upload.
+        If a file with the same name already exists in the folder it is updated in place (same file ID,
+        new revision) instead of creating a duplicate every run.
+        :param mimetype: Defaults to the type for the extension (.csv, .parquet, .arrow, ...).
+        :param chunk_size: Bytes per chunk (default DRIVE_UPLOAD_CHUNK_SIZE or 8 MB, rounded to 256 KB).
+        :param retries: Retries per chunk on 429/5xx and connection errors, with exponential
+            backoff (default DRIVE_UPLOAD_RETRIES or 5).
+        :param update_existing: Default DRIVE_UPDATE_EXISTING env (true).
+        :return: The Drive file ID, or None on failure.
+        """
         service = self._authenticate_drive()
         if not service:
             print("Exporter Agent: Could not authenticate with Drive.")
-            return
+            return None
+        from googleapiclient.http import MediaFileUpload
 
-        file_metadata = {'name': os.path.basename(file_path)}
-        if folder_id:
-            file_metadata['parents'] = [folder_id]
+        file_name = os.path.basename(file_path)
+        if mimetype is None:
+            extension = os.path.splitext(file_name)[1].lower()
+            mimetype = REPORT_MIME_TYPES.get(extension) or mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+        if chunk_size is None:
+            chunk_size = int(os.getenv("DRIVE_UPLOAD_CHUNK_SIZE", DEFAULT_UPLOAD_CHUNK_SIZE))
+        chunk_size = max(1, -(-chunk_size // UPLOAD_CHUNK_ALIGN)) * UPLOAD_CHUNK_ALIGN
+        if retries is None:
+            retries = int(os.getenv("DRIVE_UPLOAD_RETRIES", "5"))
+        if update_existing is None:
+            update_existing = os.getenv("DRIVE_UPDATE_EXISTING", "true").lower() == "true"
 
-        media = MediaFileUpload(file_path, mimetype='text/csv')
+        media = MediaFileUpload(file_path, mimetype=mimetype, chunksize=chunk_size, resumable=True)
         
         try:
-            file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-            print(f"Exporter Agent: File ID: {file.get('id')} uploaded to Drive.")
+            existing_id = self._find_drive_file(service, file_name, folder_id) if update_existing else None
+            if existing_id:
+                request = service.files().update(fileId=existing_id, media_body=media, fields='id')
+            else:
+                file_metadata = {'name': file_name}
+                if folder_id:
+                    file_metadata['parents'] = [folder_id]
+                request = service.files().create(body=file_metadata, media_body=media, fields='id')
+
+            response = None
+            while response is None:
+                # next_chunk retries 429/5xx and connection errors itself, with exponential backoff
+                status, response = request.next_chunk(num_retries=retries)
+            action = "updated on" if existing_id else "uploaded to"
+            print(f"Exporter Agent: File ID: {response.get('id')} {action} Drive.")
+            return response.get('id')
         except Exception as e:
             print(f"Exporter Agent: Failed to upload to Drive: {e}")
+            return None
 
-    def upload_to_github(self, file_path, commit_message="Update data"):
-        """Uploads a file to the GitHub repository."""
+    def _find_drive_file(self, service, file_name, folder_id=None):
+        """ID of a non-trashed file with this exact name in the folder (My Drive root if none), or None."""
+        escaped = file_name.replace("\\", "\\\\").replace("'", "\\'")
+        parent = folder_id or "root"
+        response = service.files().list(
+            q=f"name = '{escaped}' and '{parent}' in parents and trashed = false",
+            fields="files(id)",
+            pageSize=1
+        ).execute()
+        files = response.get('files', [])
+        return files[0]['id'] if files else None
+
+    def upload_to_github(self, file_path, commit_message="Update data", repo_path=None, branch=None):
+        """
+        Uploads a file to the GitHub repository, skipping the commit when the remote file already
+        has the same content (compared by git blob SHA, so nothing is downloaded).
+        :return: 'created', 'updated', 'unchanged', or None if not connected.
+        """
         if not self.repo:
             print("Exporter Agent: Not connected to GitHub.")
-            return
+            return None
+        from github import UnknownObjectException
 
-        with open(file_path, "r") as file:
+        # Binary read: reports may be Parquet/Arrow as well as CSV
+        with open(file_path, "rb") as file:
             content = file.read()
 
-        file_name = os.path.basename(file_path)
+        file_name = repo_path or os.path.basename(file_path)
+        branch = branch or os.getenv("GITHUB_BRANCH") or self.repo.default_branch
         
         try:
             # Check if file exists to update or create
-            contents = self.repo.get_contents(file_name)
-            self.repo.update_file(contents.path, commit_message, content, contents.sha)
-            print(f"Exporter Agent: Updated {file_name} on GitHub.")
-        except:
-            self.repo.create_file(file_name, commit_message, content)
+            contents = self.repo.get_contents(file_name, ref=branch)
+        except UnknownObjectException:
+            self.repo.create_file(file_name, commit_message, content, branch=branch)
             print(f"Exporter Agent: Created {file_name} on GitHub.")
+            return "created"
+
+        if contents.sha == git_blob_sha(content):
+            print(f"Exporter Agent: {file_name} unchanged on GitHub, skipping upload.")
+            return "unchanged"
+
+        self.repo.update_file(contents.path, commit_message, content, contents.sha, branch=branch)
+        print(f"Exporter Agent: Updated {file_name} on GitHub.")
+        return "updated"
+
+    def upload_files_to_github(self, file_paths, commit_message="Update data", branch=None, repo_dir="", companion_paths=()):
+        """
+        Commits several files (e.g. report CSV, Parquet and run report) in a single commit through
+        the Git Data API: one blob per changed file, one tree, one commit, one ref update.
+        Files whose content matches the branch head are left out; nothing is committed if none changed.
+        :param repo_dir: Folder in the repository for the files (default: root).
+        :param companion_paths: Files that change on every run (e.g. the run report with its timings).
+            They are added only when one of file_paths changed, so they never force a commit alone.
+        :return: The new commit SHA, or None when nothing changed or not connected.
+        """
+        if not self.repo:
+            print("Exporter Agent: Not connected to GitHub.")
+            return None
+        branch = branch or os.getenv("GITHUB_BRANCH") or self.repo.default_branch
+        ref = self.repo.get_git_ref(f"heads/{branch}")
+        base_commit = self.repo.get_git_commit(ref.object.sha)
+
+        def changed_elements(paths):
+            elements = []
+            for file_path in paths:
+                element = self._github_tree_element(file_path, repo_dir, base_commit)
+                if element:
+                    elements.append(element)
+            return elements
+
+        elements = changed_elements(file_paths)
+        if not elements:
+            print("Exporter Agent: No changes to commit on GitHub.")
+            return None
+        elements += changed_elements(companion_paths)
+
+        tree = self.repo.create_git_tree(elements, base_commit.tree)
+        commit = self.repo.create_git_commit(commit_message, tree, [base_commit])
+        ref.edit(commit.sha)
+        print(f"Exporter Agent: Committed {len(elements)} file(s) to GitHub ({commit.sha[:7]}).")
+        return commit.sha
+
+    def _github_tree_element(self, file_path, repo_dir, base_commit):
+        """Blob + tree entry for a file, or None when the branch head already has this content."""
+        from github import InputGitTreeElement, UnknownObjectException
+        with open(file_path, "rb") as file:
+            content = file.read()
+        repo_path = "/".join(part for part in (repo_dir.strip("/"), os.path.basename(file_path)) if part)
+
+        try:
+            remote_sha = self.repo.get_contents(repo_path, ref=base_commit.sha).sha
+        except UnknownObjectException:
+            remote_sha = None
+        if remote_sha == git_blob_sha(content):
+            print(f"Exporter Agent: {repo_path} unchanged on GitHub, skipping.")
+            return None
+
+        blob = self.repo.create_git_blob(base64.b64encode(content).decode("ascii"), "base64")
+        return InputGitTreeElement(repo_path, "100644", "blob", sha=blob.sha)
@@ -1,8 +1,144 @@
-import pandas as pd
-import xmltodict
+import multiprocessing
 import os
+import re
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from parse_cache import ParseCache
+import xlsx_stream
+from ptbr_numbers import iter_cell_numbers, parse_number, parse_number_series
+
+# pandas is imported where used: LOCAL XML/CSV runs (and pool workers) never need it
+
+# Bump whenever a parser's output changes, so cached rows from older parsers are ignored
+PARSER_VERSION = 5
+
+SUPPORTED_EXTENSIONS = ('.xml', '.xlsx', '.xls', '.csv')
+
+# CSV statement keywords, matched on the lowercased line (like the original str.lower() checks).
+# One findall per line tells which rules apply; IGNORECASE is avoided as it makes re several times slower.
+CSV_KEYWORDS_RE = re.compile(r'total|serviços|valor final do imposto|imposto a recolher|alíquota|%|valor retido')
+CSV_IMPOSTO_KEYWORDS = {'valor final do imposto', 'imposto a recolher'}
+CSV_ALIQUOTA_KEYWORDS = {'alíquota', '%'}
+# Rate such as "3,00%" or "5 %"
+CSV_PERCENT_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*%')
+
+# NFe elements are read with and without the portalfiscal default namespace
+NFE_NS = '{http://www.portalfiscal.inf.br/nfe}'
+NFE_DET_TAGS = {'det', NFE_NS + 'det'}
+NFE_ICMSTOT_TAGS = {'ICMSTot', NFE_NS + 'ICMSTot'}
+NFE_RETTRIB_TAGS = {'retTrib', NFE_NS + 'retTrib'}
+NFE_TOTAL_TAGS = {'total', NFE_NS + 'total'}
+# Withheld amounts in total/retTrib (PIS, COFINS, CSLL, IRRF, social security)
+NFE_RETENTION_FIELDS = ('vRetPIS', 'vRetCOFINS', 'vRetCSLL', 'vIRRF', 'vRetPrev')
+NFE_INF_TAGS = {'infNFe', NFE_NS + 'infNFe'}
+# infNFe Id attribute: "NFe" + the 44-digit access key
+NFE_KEY_RE = re.compile(r'NFe(\d{44})')
+
+# Item-level table (detail mode): one row per det, prod fields plus per-item taxes with their rates
+NFE_ITEM_COLS = [
+    'Nome Arquivo', 'Chave', 'Item', 'Codigo', 'Descricao', 'NCM', 'CFOP', 'Unidade',
+    'Quantidade', 'Valor Unitario', 'Valor Produto', 'Desconto',
+    'CST ICMS', 'Base ICMS', 'Aliquota ICMS', 'Valor ICMS', 'Base ICMS ST', 'Valor ICMS ST',
+    'Base IPI', 'Aliquota IPI', 'Valor IPI',
+    'Base PIS', 'Aliquota PIS', 'Valor PIS',
+    'Base COFINS', 'Aliquota COFINS', 'Valor COFINS',
+]
+NFE_ITEM_TEXT_COLS = {'Nome Arquivo', 'Chave', 'Item', 'Codigo', 'Descricao', 'NCM', 'CFOP', 'Unidade', 'CST ICMS'}
+# (tax group, tag) -> item column. Groups are the direct prod/imposto children; ST and other groups are ignored
+NFE_ITEM_FIELDS = {
+    ('prod', 'cProd'): 'Codigo', ('prod', 'xProd'): 'Descricao', ('prod', 'NCM'): 'NCM',
+    ('prod', 'CFOP'): 'CFOP', ('prod', 'uCom'): 'Unidade', ('prod', 'qCom'): 'Quantidade',
+    ('prod', 'vUnCom'): 'Valor Unitario', ('prod', 'vProd'): 'Valor Produto', ('prod', 'vDesc'): 'Desconto',
+    ('ICMS', 'CST'): 'CST ICMS', ('ICMS', 'CSOSN'): 'CST ICMS', ('ICMS', 'vBC'): 'Base ICMS',
+    ('ICMS', 'pICMS'): 'Aliquota ICMS', ('ICMS', 'vICMS'): 'Valor ICMS',
+    ('ICMS', 'vBCST'): 'Base ICMS ST', ('ICMS', 'vICMSST'): 'Valor ICMS ST',
+    ('IPI', 'vBC'): 'Base IPI', ('IPI', 'pIPI'): 'Aliquota IPI', ('IPI', 'vIPI'): 'Valor IPI',
+    ('PIS', 'vBC'): 'Base PIS', ('PIS', 'pPIS'): 'Aliquota PIS', ('PIS', 'vPIS'): 'Valor PIS',
+    ('COFINS', 'vBC'): 'Base COFINS', ('COFINS', 'pCOFINS'): 'Aliquota COFINS', ('COFINS', 'vCOFINS'): 'Valor COFINS',
+}
+NFE_ITEM_GROUPS = {'prod', 'ICMS', 'IPI', 'II', 'PIS', 'PISST', 'COFINS', 'COFINSST', 'ISSQN', 'ICMSUFDest'}
+
+EXPECTED_COLS = ['Nome Arquivo', 'Faturamento', 'Impostos (Total)', 'Aliquota', 'Base Calculo', 'Retencoes', 'Valor Liquido']
+
+def _pool_context():
+    """
+    Start method for the parse pool: forkserver (spawn where it doesn't exist). The pool is often
+    created while pipeline threads are running, and forking a threaded process can deadlock the
+    children on locks those threads held (logging, the SQLite cache).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def _parse_worker(file_path):
+    """
+    Process pool entry point. Returns (data, error, seconds) so failures and parse time
+    travel back to the parent logger and metrics.
+    """
+    start = time.perf_counter()
+    try:
+        return _WORKER_AGENT._parse_file(file_path), None, time.perf_counter() - start
+    except Exception as e:
+        return None, str(e), time.perf_counter() - start
+
+def iter_nfe_items(file_path):
+    """
+    Streams the det lines of an NFe as item rows (NFE_ITEM_COLS, without 'Nome Arquivo'),
+    clearing each det once read, so memory stays flat however many items the document has.
+    Missing numbers are None (written as 0.0); rates are the XML's percentages (18.00 -> 18.0).
+    """
+    key = None
+    for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+        if event == 'start':
+            # The key is an attribute of infNFe, which opens before any det
+            if elem.tag in NFE_INF_TAGS:
+                key_match = NFE_KEY_RE.fullmatch(elem.get('Id', ''))
+                key = key_match.group(1) if key_match else None
+            continue
+        if elem.tag not in NFE_DET_TAGS:
+            continue
+        item = {'Chave': key, 'Item': elem.get('nItem')}
+        group = None
+        # Depth-first walk: a group element (prod, ICMS, PIS, ...) comes before its fields
+        for child in elem.iter():
+            name = child.tag.rsplit('}', 1)[-1]
+            if name in NFE_ITEM_GROUPS:
+                group = name
+                continue
+            col = NFE_ITEM_FIELDS.get((group, name))
+            if col and child.text is not None:
+                item[col] = child.text if col in NFE_ITEM_TEXT_COLS else float(child.text)
+        elem.clear()
+        yield item
+
+def parser_type(file_path):
+    """Parser bucket used in metrics: the file extension without the dot ('xml', 'csv', 'xlsx', 'xls')."""
+    return os.path.splitext(file_path)[1].lower().lstrip('.')
 
 class OrganizerAgent:
+    def __init__(self, workers=None, chunksize=None, cache_path=None, metrics=None):
+        # workers: 1 = sequential (default), 0 or less = one per CPU core
+        if workers is None:
+            workers = int(os.getenv("ORGANIZER_WORKERS", "1"))
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.chunksize = chunksize if chunksize else int(os.getenv("ORGANIZER_CHUNKSIZE", "0"))
+
+        # Result cache is opt-in: no path, no cache
+        if cache_path is None:
+            cache_path = os.getenv("ORGANIZER_CACHE_PATH")
+        self.cache = None
+        if cache_path:
+            max_entries = int(os.getenv("ORGANIZER_CACHE_MAX_ENTRIES", "100000"))
+            self.cache = ParseCache(cache_path, PARSER_VERSION, max_entries=max_entries)
+
+        # Optional RunMetrics: parse time and outcome per parser type, skipped files, cache hits
+        self.metrics = metrics
+
     def process_data(self, files, logger_func=print):
         """
         Reads content from files (XML/Excel) and organizes them into a DataFrame.
@@ -12,212 +148,497 @@ class OrganizerAgent:
             logger_func(msg)
 
         log("Organizer Agent: Processing data...")
-        
-        extracted_data = []
 
+        # Results come back in submission order, so the report is deterministic
+        extracted_data = [data for _, data in self.parse_entries(files, log) if data]
+
+        df = self.build_dataframe(extracted_data)
+        self._count('rows', len(df))
+
+        log(f"Organizer Agent: Processed {len(df)} records.")
+        return df
+
+    def parse_entries(self, files, logger_func=print):
+        """
+        Parses files (cache first, then the pool) and returns [(file_info, row)] in input order for
+        every file that could be read; row is None when the parser found nothing or failed.
+        Rows are tagged with 'Nome Arquivo'.
+        """
+        log = logger_func
+        pending = []
         for file_info in files:
-            # Determine path: use 'local_path' if downloaded/local, else 'id' if it looks like a path
-            file_path = file_info.get("local_path", file_info.get("id"))
-            
-            # If still just an ID (Drive) and no local_path, we can't read it here yet
-            # (Main should have handled download)
-            if not os.path.exists(file_path):
-                log(f"Skipping {file_info['name']}: File not found locally.")
-                continue
+            file_path = self._resolve_path(file_info, log)
+            if file_path:
+                pending.append((file_info, file_path))
 
-            try:
+        results = [None] * len(pending)
+        to_parse = []
+        hashes = {}
+        for i, (file_info, file_path) in enumerate(pending):
+            content_hash, found, row = self._cache_lookup(file_path, file_info)
+            hashes[i] = content_hash
+            if found:
+                results[i] = (row, None)
+                self._observe(pending[i][1], 0.0, cached=True)
+            else:
+                to_parse.append(i)
+
+        paths = [pending[i][1] for i in to_parse]
+        if self.workers > 1 and len(paths) > 1:
+            parsed = self._parse_parallel(paths, log)
+        else:
+            parsed = map(_parse_worker, paths)
+
+        for i, (data, error, seconds) in zip(to_parse, parsed):
+            results[i] = (data, error)
+            self._observe(pending[i][1], seconds, error=bool(error))
+            if self.cache and not error and hashes[i]:
+                self._cache_put(hashes[i], data)
+
+        if self.cache:
+            self._cache_commit()
+            hits = len(pending) - len(to_parse)
+            log(f"Organizer Agent: Cache hits: {hits}, misses: {len(to_parse)}.")
+            self._count('cache_hits', hits)
+            self._count('cache_misses', len(to_parse))
+
+        entries = []
+        for (file_info, _), (data, error) in zip(pending, results):
+            if error:
+                log(f"Error processing {file_info['name']}: {error}")
                 data = None
-                if file_path.lower().endswith('.xml'):
-                    data = self._parse_xml(file_path)
-                elif file_path.lower().endswith(('.xlsx', '.xls')):
-                    data = self._parse_excel(file_path)
-                elif file_path.lower().endswith('.csv'):
-                    data = self._parse_csv(file_path)
-                else:
-                    # Fallback or Skip
-                    # log(f"Skipping {file_info['name']}: Unsupported format.")
+
+            if data:
+                data['Nome Arquivo'] = file_info['name']
+            entries.append((file_info, data))
+        return entries
+
+    def iter_rows(self, files, logger_func=print, log_every=100):
+        """
+        Streaming counterpart of process_data: yields one report row per parsed file, in input order,
+        as soon as it is ready. 'files' may be a generator (e.g. downloads still in progress).
+        With workers > 1, up to 2 * workers files are parsed ahead in the process pool.
+        """
+        def log(msg):
+            logger_func(msg)
+
+        log("Organizer Agent: Processing data (streaming)...")
+
+        pool = None
+        if self.workers > 1:
+            try:
+                pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+            except OSError as e:
+                log(f"Organizer Agent: Process pool unavailable ({e}), parsing sequentially.")
+
+        window = self.workers * 2
+        in_flight = deque()
+        hits = misses = rows = 0
+        try:
+            for file_info in files:
+                file_path = self._resolve_path(file_info, log)
+                if not file_path:
                     continue
-                
-                if data:
-                    data['Nome Arquivo'] = file_info['name']
-                    extracted_data.append(data)
 
+                content_hash, found, row = self._cache_lookup(file_path, file_info)
+                future = Future()
+                if found:
+                    hits += 1
+                    future.set_result((row, None, 0.0))
+                else:
+                    misses += 1
+                    if pool:
+                        future = pool.submit(_parse_worker, file_path)
+                    else:
+                        future.set_result(_parse_worker(file_path))
+                in_flight.append((file_info, file_path, content_hash, found, future))
+
+                # Hand back finished rows in order; only block when the window is full
+                while in_flight and (in_flight[0][4].done() or len(in_flight) >= window):
+                    row = self._finish_row(*in_flight.popleft(), log)
+                    if row:
+                        rows += 1
+                        if rows == 1 or rows % log_every == 0:
+                            log(f"Organizer Agent: {rows} records ready (last: {row['Nome Arquivo']}).")
+                        yield row
+
+            while in_flight:
+                row = self._finish_row(*in_flight.popleft(), log)
+                if row:
+                    rows += 1
+                    if rows == 1 or rows % log_every == 0:
+                        log(f"Organizer Agent: {rows} records ready (last: {row['Nome Arquivo']}).")
+                    yield row
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            if self.cache:
+                self._cache_commit()
+                log(f"Organizer Agent: Cache hits: {hits}, misses: {misses}.")
+                self._count('cache_hits', hits)
+                self._count('cache_misses', misses)
+            self._count('rows', rows)
+
+        log(f"Organizer Agent: Processed {rows} records.")
+
+    def iter_item_rows(self, files, logger_func=print, log_every=100000):
+        """
+        Detail mode: yields the item-level rows (NFE_ITEM_COLS) of every NFe XML in files, one det at a time.
+        Meant to be fed to a ReportWriter (see ExporterAgent.open_report_writer) so millions of items
+        never sit in memory; non-XML files are skipped.
+        """
+        def log(msg):
+            logger_func(msg)
+
+        log("Organizer Agent: Extracting NFe items...")
+        items = invoices = 0
+        for file_info in files:
+            file_path = self._resolve_path(file_info, log)
+            if not file_path or not file_path.lower().endswith('.xml'):
+                continue
+            try:
+                for item in iter_nfe_items(file_path):
+                    item['Nome Arquivo'] = file_info['name']
+                    items += 1
+                    if items % log_every == 0:
+                        log(f"Organizer Agent: {items} items ready.")
+                    yield item
+                invoices += 1
             except Exception as e:
-                log(f"Error processing {file_info['name']}: {e}")
+                log(f"Error extracting items from {file_info['name']}: {e}")
+
+        self._count('item_rows', items)
+        log(f"Organizer Agent: Extracted {items} items from {invoices} invoices.")
+
+    def process_items(self, files, logger_func=print):
+        """Item-level table as a DataFrame (typed like the streamed writers); prefer iter_item_rows for big batches."""
+        import pandas as pd
+        df = pd.DataFrame(list(self.iter_item_rows(files, logger_func)), columns=NFE_ITEM_COLS)
+        for col in NFE_ITEM_COLS:
+            if col not in NFE_ITEM_TEXT_COLS:
+                df[col] = df[col].astype('float64').fillna(0.0)
+        return df
+
+    def _finish_row(self, file_info, file_path, content_hash, from_cache, future, log):
+        """Collects a parse result: caches it, logs errors and tags the row with its file name."""
+        data, error, seconds = future.result()
+        self._observe(file_path, seconds, error=bool(error), cached=from_cache)
+        if error:
+            log(f"Error processing {file_info['name']}: {error}")
+            return None
+
+        if self.cache and content_hash and not from_cache:
+            self._cache_put(content_hash, data)
+        if data:
+            data['Nome Arquivo'] = file_info['name']
+        return data
 
-        df = pd.DataFrame(extracted_data)
+    def _resolve_path(self, file_info, log):
+        """Returns the local path to parse for a file entry, or None if it must be skipped."""
+        # Determine path: use 'local_path' if downloaded/local, else 'id' if it looks like a path
+        file_path = file_info.get("local_path", file_info.get("id"))
+        
+        # If still just an ID (Drive) and no local_path, we can't read it here yet
+        # (Main should have handled download). Entries from a local scan already carry their
+        # stat (mtime_ns), so they skip the existence check.
+        if "mtime_ns" not in file_info and not os.path.exists(file_path):
+            log(f"Skipping {file_info['name']}: File not found locally.")
+            self._count('files_skipped')
+            return None
+
+        if not file_path.lower().endswith(SUPPORTED_EXTENSIONS):
+            # Fallback or Skip
+            # log(f"Skipping {file_info['name']}: Unsupported format.")
+            self._count('files_skipped')
+            return None
+
+        return file_path
+
+    def _observe(self, file_path, seconds, error=False, cached=False):
+        if self.metrics:
+            self.metrics.observe_parse(parser_type(file_path), seconds, error=error, cached=cached)
+            if error:
+                self.metrics.incr('files_failed')
+
+    def _count(self, name, amount=1):
+        if self.metrics:
+            self.metrics.incr(name, amount)
+
+    def _cache_lookup(self, file_path, file_info=None):
+        """Returns (content_hash, found, row). content_hash is None when there is no cache or the file can't be hashed."""
+        if not self.cache:
+            return None, False, None
+        file_info = file_info or {}
+        try:
+            content_hash = self.cache.file_hash(file_path, file_info.get("size"), file_info.get("mtime_ns"))
+            found, row = self.cache.get(content_hash)
+        except (OSError, sqlite3.Error):
+            # Unreadable file or a busy/broken cache database: parse it as a miss
+            return None, False, None
+        return content_hash, found, row
+
+    def _cache_put(self, content_hash, row):
+        try:
+            self.cache.put(content_hash, row)
+        except sqlite3.Error:
+            # The row is still in the report; it just won't be cached
+            pass
+
+    def _cache_commit(self):
+        if self.cache:
+            try:
+                self.cache.commit()
+            except sqlite3.Error:
+                pass
+
+    def build_dataframe(self, rows):
+        """Builds the report DataFrame from extracted rows."""
+        import pandas as pd
+        df = pd.DataFrame(rows)
         
         # Ensure columns exist even if empty
-        expected_cols = ['Nome Arquivo', 'Faturamento', 'Impostos (Total)', 'Aliquota', 'Base Calculo', 'Retencoes', 'Valor Liquido']
-        for col in expected_cols:
+        for col in EXPECTED_COLS:
             if col not in df.columns:
                 df[col] = 0.0
 
         # Reorder to match user request
-        df = df[expected_cols]
+        df = df[EXPECTED_COLS]
         
         # Clean/Fill NaNs
-        df = df.fillna(0)
+        return df.fillna(0)
 
-        log(f"Organizer Agent: Processed {len(df)} records.")
-        return df
+    def _parse_parallel(self, paths, log):
+        """Parses files across a process pool. Falls back to sequential if the pool can't run."""
+        chunksize = self.chunksize
+        if not chunksize:
+            # ~4 chunks per worker keeps the pool balanced without per-file IPC overhead
+            chunksize = max(1, min(256, len(paths) // (self.workers * 4)))
 
-    def _parse_number(self, val_str):
-        """Converts PT-BR number string (1.234,56) to float (1234.56)."""
-        if isinstance(val_str, (int, float)):
-            return float(val_str)
+        log(f"Organizer Agent: Parsing {len(paths)} files with {self.workers} workers (chunksize={chunksize}).")
         try:
-            # Remove dots, replace comma with dot
-            clean_str = str(val_str).replace('.', '').replace(',', '.')
-            return float(clean_str)
-        except:
-            return 0.0
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context()) as pool:
+                return list(pool.map(_parse_worker, paths, chunksize=chunksize))
+        except (OSError, BrokenProcessPool) as e:
+            log(f"Organizer Agent: Process pool unavailable ({e}), parsing sequentially.")
+            return [_parse_worker(path) for path in paths]
+
+    def _parse_file(self, file_path):
+        """Dispatches a file to the parser for its extension. Returns None for unsupported formats."""
+        lower_path = file_path.lower()
+        if lower_path.endswith('.xml'):
+            return self._parse_xml(file_path)
+        elif lower_path.endswith(('.xlsx', '.xls')):
+            return self._parse_excel(file_path)
+        elif lower_path.endswith('.csv'):
+            return self._parse_csv(file_path)
+        # Fallback or Skip
+        return None
+
+    def _parse_number(self, val_str):
+        """Converts PT-BR number string (1.234,56) to float (1234.56); 0.0 if it isn't a number."""
+        val = parse_number(val_str, allow_percent=False)
+        return val if val is not None else 0.0
 
     def _parse_xml(self, file_path):
         """Parses NFe XML to extract tax info."""
-        try:
-            with open(file_path, 'rb') as f:
-                doc = xmltodict.parse(f)
-            
-            # Navigate the potentially complex NFe structure. 
-            # Structure varies (NFe vs NFCe vs NFS-e), this is a generic attempt for NFe.
-            # Ideally, we look for key tags recursively or use known paths.
-            
-            # Simplified access attempting to find 'infNFe'
-            
-            # Try standard NFe path
-            nfe = doc.get('nfeProc', {}).get('NFe', {}).get('infNFe', {})
-            if not nfe:
-                nfe = doc.get('NFe', {}).get('infNFe', {})
-            
-            total = nfe.get('total', {}).get('ICMSTot', {})
-            
-            # Extract Values (converting to float)
-            def get_val(obj, key):
-                return float(obj.get(key, 0))
+        return self._parse_xml_stream(file_path)
 
-            faturamento = get_val(total, 'vNF')
-            impostos = get_val(total, 'vTotTrib') # Or sum of vICMS, vIPI, vPIS, vCOFINS
-            if impostos == 0:
-                 # Calculate manually if vTotTrib is empty
-                 impostos = get_val(total, 'vICMS') + get_val(total, 'vIPI') + get_val(total, 'vPIS') + get_val(total, 'vCOFINS')
+    def _parse_xml_stream(self, file_path):
+        """Incremental NFe parser: stops once the total group is read and frees item lines as it goes."""
+        try:
+            total = {}
+            retentions = {}
+            for event, elem in ET.iterparse(file_path):
+                tag = elem.tag
+                if tag in NFE_DET_TAGS:
+                    # Item lines are the bulk of the document and aren't needed for totals
+                    elem.clear()
+                elif tag in NFE_ICMSTOT_TAGS:
+                    total = {child.tag.rsplit('}', 1)[-1]: child.text for child in elem}
+                elif tag in NFE_RETTRIB_TAGS:
+                    retentions = {child.tag.rsplit('}', 1)[-1]: child.text for child in elem}
+                elif tag in NFE_TOTAL_TAGS:
+                    break
 
-            base_calc = get_val(total, 'vBC')
-            
-            # Retentions often in 'retTrib' or separate
-            # For this MVP, let's look for standard fields
-            retencoes = 0.0 # Placeholder
-            
-            valor_liq = faturamento - retencoes # Simplified logic
-
-            return {
-                'Faturamento': faturamento,
-                'Impostos (Total)': impostos,
-                'Aliquota': 0.0, # Hard to infer single rate for whole NFe
-                'Base Calculo': base_calc,
-                'Retencoes': retencoes,
-                'Valor Liquido': valor_liq
-            }
+            return self._build_xml_row(total, retentions)
         except Exception as e:
-            # print(f"XML Parse Error: {e}")
             return None
 
+    def _build_xml_row(self, total, retentions=None):
+        """Builds the report row from the ICMSTot fields and the retTrib retentions."""
+        # Extract Values (converting to float)
+        def get_val(obj, key):
+            return float(obj.get(key) or 0)
+
+        faturamento = get_val(total, 'vNF')
+        impostos = get_val(total, 'vTotTrib') # Or sum of vICMS, vIPI, vPIS, vCOFINS
+        if impostos == 0:
+             # Calculate manually if vTotTrib is empty
+             impostos = get_val(total, 'vICMS') + get_val(total, 'vIPI') + get_val(total, 'vPIS') + get_val(total, 'vCOFINS')
+
+        base_calc = get_val(total, 'vBC')
+        
+        # Withholdings reported in total/retTrib
+        retentions = retentions or {}
+        retencoes = sum(get_val(retentions, key) for key in NFE_RETENTION_FIELDS)
+        
+        valor_liq = faturamento - retencoes # Simplified logic
+
+        # Items can carry different rates: report the effective ICMS rate over the ICMS base
+        aliquota = round(get_val(total, 'vICMS') / base_calc * 100, 2) if base_calc else 0.0
+
+        return {
+            'Faturamento': faturamento,
+            'Impostos (Total)': impostos,
+            'Aliquota': aliquota,
+            'Base Calculo': base_calc,
+            'Retencoes': retencoes,
+            'Valor Liquido': valor_liq
+        }
+
     def _parse_excel(self, file_path):
         """Parses Excel to find Billing/Tax columns."""
-        # Heuristic: Read first sheet, look for header row
+        # .xls needs a different engine; only .xlsx has the streaming fast path
+        if not file_path.lower().endswith('.xlsx'):
+            return self._parse_excel_pandas(file_path)
+
+        try:
+            # Heuristic: Read first sheet; only the header row is inspected to pick the target columns,
+            # then the sheet XML is streamed keeping just those (at most two) columns
+            picked = {}
+            def select_columns(header):
+                picked['faturamento'], picked['impostos'] = self._find_excel_columns(header)
+                return [idx for idx in picked.values() if idx is not None]
+
+            values = xlsx_stream.read_columns(file_path, select_columns)
+
+            faturamento_idx = picked.get('faturamento')
+            impostos_idx = picked.get('impostos')
+            faturamento = self._sum_ptbr_column(values[faturamento_idx]) if faturamento_idx is not None else 0.0
+            impostos = self._sum_ptbr_column(values[impostos_idx]) if impostos_idx is not None else 0.0
+            return self._build_excel_row(faturamento, impostos)
+        except Exception:
+            return None
+
+    def _parse_excel_pandas(self, file_path):
+        """Whole-sheet pandas Excel parser. Used for .xls and as the benchmark reference."""
+        import pandas as pd
         try:
             df = pd.read_excel(file_path)
             
             # Normalize columns to lowercase for search
             df.columns = df.columns.astype(str).str.lower()
-            
-            # Look for keywords
-            faturamento = 0.0
-            impostos = 0.0
-            
-            # Simple sum of columns that look like 'valor' or 'total'
-            for col in df.columns:
-                if 'total' in col or 'valor' in col:
-                    faturamento = df[col].sum()
-                    break # Take first match
-            
-            for col in df.columns:
-                if 'imposto' in col or 'tributo' in col:
-                    impostos = df[col].sum()
-                    break
+            faturamento_idx, impostos_idx = self._find_excel_columns(df.columns)
 
-            return {
-                'Faturamento': faturamento,
-                'Impostos (Total)': impostos,
-                'Aliquota': 0.0,
-                'Base Calculo': faturamento, # Assumption
-                'Retencoes': 0.0,
-                'Valor Liquido': faturamento - impostos
-            }
+            faturamento = self._sum_ptbr_column(df.iloc[:, faturamento_idx]) if faturamento_idx is not None else 0.0
+            impostos = self._sum_ptbr_column(df.iloc[:, impostos_idx]) if impostos_idx is not None else 0.0
+            return self._build_excel_row(faturamento, impostos)
         except Exception:
             return None
 
+    def _find_excel_columns(self, header):
+        """Returns the (faturamento, impostos) column indexes from lowercased header names; None if absent."""
+        faturamento_idx = None
+        impostos_idx = None
+
+        # Simple sum of columns that look like 'valor' or 'total'
+        for idx, col in enumerate(header):
+            if 'total' in col or 'valor' in col:
+                faturamento_idx = idx
+                break # Take first match
+        
+        for idx, col in enumerate(header):
+            if 'imposto' in col or 'tributo' in col:
+                impostos_idx = idx
+                break
+
+        return faturamento_idx, impostos_idx
+
+    def _sum_ptbr_column(self, values):
+        """Sums a column vectorized: numeric cells as-is, text cells as PT-BR numbers (R$ 1.234,56), others ignored."""
+        return float(parse_number_series(values).sum())
+
+    def _build_excel_row(self, faturamento, impostos):
+        """Builds the report row from the summed Excel columns."""
+        return {
+            'Faturamento': faturamento,
+            'Impostos (Total)': impostos,
+            'Aliquota': 0.0,
+            'Base Calculo': faturamento, # Assumption
+            'Retencoes': 0.0,
+            'Valor Liquido': faturamento - impostos
+        }
+
     def _parse_csv(self, file_path):
-        """Parses CSV (unstructured) to find Billing/Tax info."""
-        try:
-            # Read as text lines because it might not be a clean table
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-            
-            faturamento = 0.0
-            impostos = 0.0
-            base_calc = 0.0
-            retencoes = 0.0
-            aliquota = 0.0
-
-            for line in lines:
-                line_lower = line.lower()
-                parts = line.split(';')
-                
+        """
+        Parses CSV (unstructured) statements in one streaming pass, matching only precompiled line patterns.
+        Read errors propagate so the caller logs them and counts them as parse errors.
+        """
+        faturamento = 0.0
+        impostos = 0.0
+        base_calc = 0.0
+        retencoes = 0.0
+        aliquota = 0.0
+
+        # Read as text lines because it might not be a clean table
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                # Most lines carry none of the keywords: skip them after a single scan
+                keywords = set(CSV_KEYWORDS_RE.findall(line.lower()))
+                if not keywords:
+                    continue
+
+                # Values (positive numeric ';' cells) are only extracted when a rule still needs them
+                values = None
+
                 # Check for Base de Calculo / Total
-                if 'total' in line_lower and 'serviços' not in line_lower: # Avoid "Total Serviços" duplications if listed twice
-                     # Look for the numeric part
-                     for part in parts:
-                         val = self._parse_number(part)
-                         if val > 0:
-                             # Heuristic: largest "Total" found could be Faturamento/Base
-                             if val > faturamento:
-                                 faturamento = val
-                                 base_calc = val
+                if 'total' in keywords and 'serviços' not in keywords: # Avoid "Total Serviços" duplications if listed twice
+                    values = self._csv_line_values(line)
+                    # Heuristic: largest "Total" found could be Faturamento/Base
+                    if values and max(values) > faturamento:
+                        faturamento = max(values)
+                        base_calc = faturamento
 
                 # Check for Taxes
-                if 'valor final do imposto' in line_lower or 'imposto a recolher' in line_lower:
-                    for part in parts:
-                        val = self._parse_number(part)
-                        if val > 0:
-                            impostos = val
-                
+                if keywords & CSV_IMPOSTO_KEYWORDS:
+                    values = values if values is not None else self._csv_line_values(line)
+                    if values:
+                        impostos = values[-1]
+
                 # Check for Aliquota
-                if 'alíquota' in line_lower or '%' in line:
-                     for part in parts:
-                         val = self._parse_number(part)
-                         if val > 0:
-                             # This catches the calculated tax amount from the line "Aliquota X%; Value"
-                             # In the example CSV: "Alíquota 3,00%;1.029,92"
-                             # If we haven't found a "Final Tax", this is a good candidate
-                             if impostos == 0:
-                                 impostos = val
+                # Once a tax value and a rate are known these lines add nothing, which matters
+                # for statements carrying a "3,00%" cell on every detail line
+                if keywords & CSV_ALIQUOTA_KEYWORDS and (impostos == 0 or aliquota == 0):
+                    # This catches the calculated tax amount from the line "Aliquota X%; Value"
+                    # In the example CSV: "Alíquota 3,00%;1.029,92"
+                    # If we haven't found a "Final Tax", this is a good candidate
+                    if impostos == 0:
+                        values = values if values is not None else self._csv_line_values(line)
+                        if values:
+                            impostos = values[0]
+                    if aliquota == 0:
+                        rate = CSV_PERCENT_RE.search(line)
+                        if rate:
+                            aliquota = float(rate.group(1).replace(',', '.'))
 
                 # Check for Retentions
-                if 'valor retido' in line_lower:
-                    for part in parts:
-                        val = self._parse_number(part)
-                        if val > 0:
-                            retencoes = val
-
-            return {
-                'Faturamento': faturamento,
-                'Impostos (Total)': impostos,
-                'Aliquota': 0.0, # Hard to parse exact rate from text easily without regex
-                'Base Calculo': base_calc,
-                'Retencoes': retencoes,
-                'Valor Liquido': faturamento - impostos - retencoes
-            }
-        except Exception as e:
-            print(f"CSV Parse Error: {e}")
-            return None
+                if 'valor retido' in keywords:
+                    values = values if values is not None else self._csv_line_values(line)
+                    if values:
+                        retencoes = values[-1]
+
+        return {
+            'Faturamento': faturamento,
+            'Impostos (Total)': impostos,
+            'Aliquota': aliquota,
+            'Base Calculo': base_calc,
+            'Retencoes': retencoes,
+            'Valor Liquido': faturamento - impostos - retencoes
+        }
+
+    def _csv_line_values(self, line):
+        """Positive PT-BR numbers found in the ';' cells of a line, in order."""
+        return [val for val in iter_cell_numbers(line) if val > 0]
+
+# Parser used by _parse_worker: one per process, with no cache (the parent owns the cache)
+_WORKER_AGENT = OrganizerAgent(workers=1, cache_path="")
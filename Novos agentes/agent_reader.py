@@ -1,15 +1,45 @@
 import os
-import glob
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from googleapiclient.errors import HttpError
+import fnmatch
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import drive_client
+from drive_client import RETRYABLE_STATUS
 
-# If modifying these scopes, delete the file token.json.
-SCOPES = ["https://www.googleapis.com/auth/drive"]
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+def _glob_matches(patterns, rel_path, name):
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+def _local_file_wanted(rel_path, name, include, exclude, extensions):
+    """Extension/include/exclude filters of the local walker, checked before any stat."""
+    if extensions and not name.lower().endswith(extensions):
+        return False
+    if include and not _glob_matches(include, rel_path, name):
+        return False
+    return not (exclude and _glob_matches(exclude, rel_path, name))
+
+def _local_entry(path, rel_path, st):
+    return {
+        "id": path,
+        "name": os.path.basename(path),
+        "mimeType": "application/octet-stream", # Generic local type
+        "local_path": path,
+        "relative_path": rel_path,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+def _download_name(file_info):
+    """
+    Local file name for a Drive download: the file id prefix keeps same-named files from
+    different Drive folders apart (the report still uses file_info['name']).
+    """
+    name = file_info['name'].replace('/', '_').replace('\\', '_')
+    return f"{file_info['id']}_{name}"
 
 class ReaderAgent:
     def __init__(self):
@@ -20,95 +50,183 @@ class ReaderAgent:
         self.service = None
 
     def authenticate(self):
-        """Authenticates with Google Drive API."""
-        self.creds = None
-        
-        # 1. Try Service Account (Cloud Production)
-        if os.path.exists('service_account.json'):
-            try:
-                from google.oauth2 import service_account
-                self.creds = service_account.Credentials.from_service_account_file(
-                    'service_account.json', scopes=SCOPES)
-                print("Reader Agent: Authenticated with Service Account.")
-            except Exception as e:
-                print(f"Reader Agent: Service Account Auth failed: {e}")
-
-        # 2. Key User Token (Local / Fallback)
-        if not self.creds: 
-             if os.path.exists("token.json"):
-                self.creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-        
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                try:
-                    self.creds.refresh(Request())
-                except:
-                    self.creds = None
-            
-            # Interactive flow (Only works locally)
-            if not self.creds and not os.path.exists('service_account.json'):
-                try:
-                     flow = InstalledAppFlow.from_client_secrets_file(
-                        "credentials.json", SCOPES)
-                     self.creds = flow.run_local_server(port=0)
-                     with open("token.json", "w") as token:
-                        token.write(self.creds.to_json())
-                except:
-                     print("Reader Agent: Interactive auth failed (headless environment?)")
-
+        """Authenticates with Google Drive API (credentials and service are shared with the exporter)."""
+        self.creds = drive_client.get_credentials()
         try:
-            self.service = build("drive", "v3", credentials=self.creds)
+            self.service = drive_client.get_service()
             print("Reader Agent: Authenticated successfully with Google Drive.")
         except Exception as e:
             print(f"An error occurred: {e}")
             self.service = None
 
-    def list_files(self, folder_id=None, source_type=None, override_path=None):
-        """Lists files based on the configured or overridden source type."""
+    def list_files(self, folder_id=None, source_type=None, override_path=None, recursive=False, mime_types=None, extensions=None, **local_options):
+        """
+        Lists files based on the configured or overridden source type.
+        local_options (max_depth, include, exclude) are passed to iter_local_files for LOCAL sources.
+        """
         # Determine source and path (override takes precedence)
         current_source = source_type if source_type else self.source_type
         current_path = override_path if override_path else self.local_folder_path
         
         if current_source == "LOCAL":
-            return self._list_local_files(current_path)
+            return self._list_local_files(current_path, recursive=recursive, extensions=extensions, **local_options)
         else:
-            return self._list_drive_files(folder_id)
+            return self._list_drive_files(folder_id, recursive=recursive, mime_types=mime_types, extensions=extensions)
 
-    def _list_local_files(self, folder_path):
-        """Lists files from the local directory."""
+    def _list_local_files(self, folder_path, **options):
+        """Lists files from the local directory (see iter_local_files for the options)."""
         if not os.path.exists(folder_path):
             print(f"Reader Agent: Local folder '{folder_path}' does not exist.")
             return []
         
-        files = []
-        for filepath in glob.glob(os.path.join(folder_path, "*")):
-            if os.path.isfile(filepath):
-                files.append({
-                    "id": filepath,
-                    "name": os.path.basename(filepath),
-                    "mimeType": "application/octet-stream" # Generic local type
-                })
+        files = list(self.iter_local_files(folder_path, **options))
         
         print(f"Reader Agent: Found {len(files)} files in local folder: {folder_path}")
         return files
 
-    def _list_drive_files(self, folder_id):
+    def iter_local_files(self, folder_path, recursive=False, max_depth=None, include=None, exclude=None, extensions=None):
+        """
+        Walks a local folder with os.scandir and lazily yields file dicts, in name order per folder.
+        Entries already carry 'size' and 'mtime_ns', so later stages (parse cache, change detection)
+        don't stat the file again; filters run on the directory entry before any stat.
+        :param recursive: Also walk subfolders (depth-first). Symlinked folders are not followed.
+        :param max_depth: With recursive, how many folder levels below folder_path to enter (None = no limit).
+        :param include: Glob patterns (e.g. ['2024/*', '*.xml']); a file must match one, by relative path or name.
+        :param exclude: Glob patterns; matching files and folders are skipped.
+        :param extensions: Only files whose name ends with one of these, e.g. ('.xml', '.csv').
+        """
+        if not os.path.isdir(folder_path):
+            return
+        extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        include = list(include or [])
+        exclude = list(exclude or [])
+
+        stack = [(folder_path, "", 0)]
+        while stack:
+            current, rel_dir, depth = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                print(f"Reader Agent: Cannot read folder '{current}': {e}")
+                continue
+
+            subfolders = []
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and (max_depth is None or depth < max_depth) and not _glob_matches(exclude, rel_path, entry.name):
+                            subfolders.append((entry.path, rel_path, depth + 1))
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                if not _local_file_wanted(rel_path, entry.name, include, exclude, extensions):
+                    continue
+
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield _local_entry(entry.path, rel_path, st)
+
+            # Reversed so the stack pops subfolders in name order
+            stack.extend(reversed(subfolders))
+
+    def local_file_entry(self, folder_path, file_path, recursive=False, max_depth=None, include=None, exclude=None, extensions=None):
+        """
+        The entry iter_local_files would yield for one path under folder_path (same filters),
+        or None if the file is filtered out or no longer exists. Used to check single changed files.
+        """
+        rel_path = os.path.relpath(file_path, folder_path).replace(os.sep, "/")
+        parts = rel_path.split("/")
+        if rel_path.startswith("../") or (len(parts) > 1 and not recursive):
+            return None
+        if max_depth is not None and len(parts) - 1 > max_depth:
+            return None
+        exclude = list(exclude or [])
+        for depth in range(1, len(parts)):
+            if _glob_matches(exclude, "/".join(parts[:depth]), parts[depth - 1]):
+                return None
+
+        extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        if not _local_file_wanted(rel_path, parts[-1], list(include or []), exclude, extensions):
+            return None
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        if not os.path.isfile(file_path):
+            return None
+        return _local_entry(os.path.join(folder_path, *parts), rel_path, st)
+
+    def _list_drive_files(self, folder_id, recursive=False, mime_types=None, extensions=None):
         """Lists files from a specific Google Drive folder."""
         if not self.service: # Helper to auto-auth if needed? Or assume auth'd.
              # self.authenticate() # Be careful about side effects
              print("Reader Agent: Drive Service not initialized. Run authenticate() first.")
              return []
 
-        results = self.service.files().list(
-            q=f"'{folder_id}' in parents and trashed=false",
-            fields="nextPageToken, files(id, name, mimeType)",
-            pageSize=1000  # Adjust as needed (max 1000)
-        ).execute()
-        files = results.get('files', [])
+        files = list(self.iter_drive_files(folder_id, recursive=recursive, mime_types=mime_types, extensions=extensions))
         
         print(f"Reader Agent: Found {len(files)} files in Drive.")
         return files
 
+    def iter_drive_files(self, folder_id, recursive=False, mime_types=None, extensions=None, page_size=1000):
+        """
+        Yields files from a Drive folder page by page, following nextPageToken.
+        :param recursive: Also walk subfolders (breadth-first).
+        :param mime_types: Only files with one of these mimeTypes (filtered by the Drive query).
+        :param extensions: Only files whose name ends with one of these, e.g. ('.xml', '.csv').
+            Checked client side: Drive's 'name contains' only matches word prefixes, so it can't
+            express "ends with" and would drop real matches.
+        """
+        if not self.service:
+             print("Reader Agent: Drive Service not initialized. Run authenticate() first.")
+             return
+
+        extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        file_filter = self._drive_filter_query(mime_types)
+
+        folders = deque([folder_id])
+        while folders:
+            current_folder = folders.popleft()
+            query = f"'{current_folder}' in parents and trashed=false"
+            if file_filter and recursive:
+                # Folders must still come back to be walked
+                query += f" and ({file_filter} or mimeType = '{FOLDER_MIME_TYPE}')"
+            elif file_filter:
+                query += f" and ({file_filter})"
+
+            page_token = None
+            while True:
+                results = self.service.files().list(
+                    q=query,
+                    fields="nextPageToken, files(id, name, mimeType, size, modifiedTime)",
+                    pageSize=page_size,  # Max 1000
+                    pageToken=page_token
+                ).execute()
+
+                for file_info in results.get('files', []):
+                    if file_info.get('mimeType') == FOLDER_MIME_TYPE:
+                        if recursive:
+                            folders.append(file_info['id'])
+                        continue
+                    if extensions and not file_info['name'].lower().endswith(extensions):
+                        continue
+                    yield file_info
+
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+
+    def _drive_filter_query(self, mime_types):
+        """Builds the server-side Drive query clause for the mimeType filter."""
+        return " or ".join(f"mimeType = '{mime_type}'" for mime_type in mime_types or [])
+
     def download_file(self, file_id, file_name, destination_folder="temp_downloads"):
         """Downloads a file from Drive to a local folder."""
         if not self.service:
@@ -121,17 +239,98 @@ class ReaderAgent:
         local_path = os.path.join(destination_folder, file_name)
         
         try:
-            request = self.service.files().get_media(fileId=file_id)
-            with open(local_path, 'wb') as fh:
-                downloader = MediaIoBaseDownload(fh, request)
-                done = False
-                while done is False:
-                    status, done = downloader.next_chunk()
-                    # print(f"Download {int(status.progress() * 100)}%.")
+            self._download_with_retry(self.service, file_id, local_path)
             return local_path
         except Exception as e:
             print(f"Reader Agent: Failed to download {file_name}. Error: {e}")
             return None
-        except HttpError as error:
-            print(f"An error occurred: {error}")
-            return []
+
+    def download_files(self, files, destination_folder="temp_downloads", max_workers=None, service_factory=None, logger_func=print):
+        """
+        Downloads Drive files concurrently with a bounded thread pool.
+        Sets 'local_path' on every file downloaded and returns how many succeeded.
+        """
+        downloaded = self.iter_downloads(files, destination_folder, max_workers, service_factory, logger_func)
+        return sum(1 for file_info in downloaded if file_info.get('local_path'))
+
+    def iter_downloads(self, files, destination_folder="temp_downloads", max_workers=None, service_factory=None, logger_func=print, metrics=None):
+        """
+        Downloads Drive files concurrently and yields each file dict, in input order, once it is done.
+        'files' may be a generator (e.g. iter_drive_files): downloads start while listing continues,
+        and at most 2 * max_workers downloads are in flight.
+        :param max_workers: Concurrent downloads (default DRIVE_DOWNLOAD_WORKERS or 4).
+        :param service_factory: Callable returning a new Drive service. Each worker thread gets its own,
+            since the googleapiclient/httplib2 client is not thread-safe. Defaults to the shared
+            drive_client (one cached service per thread).
+        :param metrics: Optional RunMetrics; records per-file download time, bytes and failures.
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv("DRIVE_DOWNLOAD_WORKERS", "4"))
+        max_workers = max(1, max_workers)
+
+        if service_factory is None:
+            if not self.creds:
+                logger_func("Reader Agent: Drive Service not initialized. Run authenticate() first.")
+                return
+            service_factory = drive_client.get_service
+
+        if not os.path.exists(destination_folder):
+            os.makedirs(destination_folder)
+
+        local = threading.local()
+
+        def worker(file_info):
+            if not hasattr(local, "service"):
+                local.service = service_factory()
+            local_path = os.path.join(destination_folder, _download_name(file_info))
+            start = time.perf_counter()
+            try:
+                self._download_with_retry(local.service, file_info['id'], local_path)
+                file_info['local_path'] = local_path
+                if metrics:
+                    metrics.incr('files_downloaded')
+                    metrics.incr('bytes_downloaded', os.path.getsize(local_path))
+            except Exception as e:
+                logger_func(f"Reader Agent: Failed to download {file_info['name']}. Error: {e}")
+                if metrics:
+                    metrics.incr('files_download_failed')
+            if metrics:
+                metrics.add_time('download', time.perf_counter() - start)
+            return file_info
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            in_flight = deque()
+            for file_info in files:
+                in_flight.append(pool.submit(worker, file_info))
+                if len(in_flight) >= max_workers * 2:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+
+    def _download_with_retry(self, service, file_id, local_path, retries=None, backoff=None):
+        """Downloads one file, retrying 429/5xx and connection errors with exponential backoff and jitter."""
+        if retries is None:
+            retries = int(os.getenv("DRIVE_DOWNLOAD_RETRIES", "5"))
+        if backoff is None:
+            backoff = float(os.getenv("DRIVE_DOWNLOAD_BACKOFF", "1.0"))
+
+        from googleapiclient.errors import HttpError
+        from googleapiclient.http import MediaIoBaseDownload
+
+        attempt = 0
+        while True:
+            try:
+                request = service.files().get_media(fileId=file_id)
+                with open(local_path, 'wb') as fh:
+                    downloader = MediaIoBaseDownload(fh, request)
+                    done = False
+                    while done is False:
+                        status, done = downloader.next_chunk()
+                return local_path
+            except (HttpError, ConnectionError, TimeoutError) as e:
+                status = int(getattr(getattr(e, "resp", None), "status", 0) or 0)
+                retryable = status in RETRYABLE_STATUS or not isinstance(e, HttpError)
+                if not retryable or attempt >= retries:
+                    raise
+                time.sleep(backoff * (2 ** attempt) + random.uniform(0, backoff))
+                attempt += 1
@@ -1,99 +1,167 @@
 from flask import Flask, render_template, request, Response, jsonify, send_file
-import threading
-import queue
-import time
 import os
+import time
 from main import run_system
+from agent_exporter import ExporterAgent
+from run_metrics import REGISTRY
+from jobs import JobManager, QueueFull
 
 app = Flask(__name__)
 
-# Queue to store logs for the current session/request
-log_queue = queue.Queue()
+REPORT_FORMATS = ('csv', 'parquet', 'arrow')
+
+# Idle streams get a comment ping so proxies keep them open and dead clients are noticed
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+# A stream ends after this long and the client reconnects with Last-Event-ID; by default one
+# heartbeat, so an SSE client holds one of the gunicorn threads only briefly at a time (0 = no limit)
+SSE_MAX_DURATION = float(os.getenv("SSE_MAX_DURATION", str(SSE_HEARTBEAT)))
+# Longest a log poll waits for new lines. The page polls by default: a short wait keeps each
+# viewer's thread free between polls, so open log tabs can't starve /api/run and the status calls
+LONG_POLL_TIMEOUT = float(os.getenv("LONG_POLL_TIMEOUT", "2"))
 
-def web_logger(message):
-    """Callback function to push logs to the queue."""
-    log_queue.put(message)
+def run_job(job):
+    """Runs one job's pipeline with its own log buffer, download folder and report path."""
+    params = job.params
+    return run_system(
+        source_type=params['source_type'],
+        path_or_id=params['path_or_id'],
+        export_local=True,
+        export_drive=params['export_drive'],
+        export_github=params['export_github'],
+        logger_func=job.log.append,
+        output_path=os.path.join(job.work_dir, "relatorio_final.csv"),
+        download_dir=os.path.join(job.work_dir, "downloads")
+    )
+
+# Jobs live in this process: run gunicorn with one worker (and threads) so every request sees them
+jobs = JobManager(run_job)
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
-# Global variable to store the path of the last generated report
-last_report_path = None
-
 @app.route('/api/run', methods=['POST'])
 def run_agents():
-    global last_report_path
-    data = request.json
+    data = request.json or {}
     source_type = data.get('source_type', 'LOCAL')
     path_or_id = data.get('path_or_id')
     export_drive = data.get('export_drive', False)
     export_github = data.get('export_github', False)
-    
+
     # Validation
     if not path_or_id:
         return jsonify({"error": "Path or ID is required"}), 400
 
-    # Clear queue
-    with log_queue.mutex:
-        log_queue.queue.clear()
-
-    # Run in separate thread
-    def target():
-        global last_report_path
-        try:
-            # Capture the return value from run_system (which should be the path)
-            result = run_system(
-                source_type=source_type,
-                path_or_id=path_or_id,
-                export_local=True,
-                export_drive=export_drive,
-                export_github=export_github,
-                logger_func=web_logger
-            )
-            web_logger(f"DEBUG: run_system returned: {result}")
-            
-            # Check if result looks like a path or success message
-            if result and os.path.exists(str(result)):
-                 last_report_path = str(result)
-                 web_logger(f"DEBUG: Report path set to: {last_report_path}")
-            else:
-                 web_logger("DEBUG: Returned path does not exist or is empty.")
-            
-            web_logger("DONE") # Signal completion
-        except Exception as e:
-            web_logger(f"CRITICAL ERROR: {e}")
-            web_logger("DONE")
-
-    thread = threading.Thread(target=target)
-    thread.start()
-
-    return jsonify({"status": "started"})
-
-@app.route('/stream_logs')
-def stream_logs():
+    try:
+        job = jobs.submit({
+            'source_type': source_type,
+            'path_or_id': path_or_id,
+            'export_drive': export_drive,
+            'export_github': export_github,
+        })
+    except QueueFull as e:
+        return jsonify({"error": f"Too many jobs, try again later ({e})."}), 429, {"Retry-After": "30"}
+
+    return jsonify({"status": "queued", "job_id": job.id}), 202
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+def _last_event_id():
+    """Resume point: the Last-Event-ID header on reconnects, or ?last_event_id= on first connect."""
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return 0
+
+def _sse(data, event_id=None):
+    # SSE data can't contain raw newlines: one data field per line
+    message = f"id: {event_id}\n" if event_id is not None else ""
+    return message + "".join(f"data: {part}\n" for part in str(data).split("\n")) + "\n"
+
+@app.route('/stream_logs/<job_id>')
+def stream_logs(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    seq = _last_event_id()
+
     def generate():
+        nonlocal seq
+        deadline = time.monotonic() + SSE_MAX_DURATION if SSE_MAX_DURATION > 0 else None
+        yield "retry: 3000\n\n"
         while True:
-            message = log_queue.get()
-            if message == "DONE":
-                yield f"data: {message}\n\n"
+            entries, dropped, closed = job.log.read_after(seq, timeout=SSE_HEARTBEAT)
+            if dropped:
+                yield _sse(f"... {dropped} earlier log lines no longer available.")
+            for seq, line in entries:
+                yield _sse(line, seq)
+            if closed and not entries:
+                yield _sse("DONE")
+                break
+            if not entries:
+                yield ": ping\n\n"
+            if deadline and time.monotonic() >= deadline:
+                # Browser reconnects after `retry` ms and resumes from the last id it saw
                 break
-            yield f"data: {message}\n\n"
-    return Response(generate(), mimetype='text/event-stream')
-
-@app.route('/download_report')
-def download_report():
-    global last_report_path
-    if last_report_path and os.path.exists(last_report_path):
-        return send_file(last_report_path, as_attachment=True)
-    
-    # Fallback to local default if global path not set
-    file_path = "relatorio_final.csv"
-    if os.path.exists(file_path):
-         return send_file(file_path, as_attachment=True)
-         
-    return "File not found", 404
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+@app.route('/api/jobs/<job_id>/logs')
+def poll_logs(job_id):
+    """Log polling (the page default): ?after=<seq> returns newer lines, waiting up to ?timeout= seconds for some."""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    try:
+        after = max(0, int(request.args.get('after', 0)))
+        timeout = min(float(request.args.get('timeout', LONG_POLL_TIMEOUT)), LONG_POLL_TIMEOUT)
+    except ValueError:
+        return jsonify({"error": "after and timeout must be numbers"}), 400
+
+    entries, dropped, closed = job.log.read_after(after, timeout=max(0.0, timeout))
+    return jsonify({
+        "lines": [{"seq": seq, "line": line} for seq, line in entries],
+        "next": entries[-1][0] if entries else after,
+        "dropped": dropped,
+        "done": closed and not entries,
+        "status": job.status,
+    })
+
+@app.route('/download_report/<job_id>')
+def download_report(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    # Optional ?format=csv|parquet|arrow converts the report, streaming it batch by batch
+    report_format = request.args.get('format', '').lower()
+    if report_format and report_format not in REPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format. Use one of: {', '.join(REPORT_FORMATS)}"}), 400
+
+    if not job.report_path or not os.path.exists(job.report_path):
+        return "File not found", 404
+
+    report_path = job.report_path
+    if report_format and not report_path.lower().endswith(f".{report_format}"):
+        converted_path = f"{os.path.splitext(report_path)[0]}.{report_format}"
+        if not os.path.exists(converted_path):
+            converted_path = ExporterAgent().convert_report(report_path, converted_path)
+        if not converted_path:
+            return "File not found", 404
+        report_path = converted_path
+    return send_file(report_path, as_attachment=True)
+
+@app.route('/metrics')
+def metrics():
+    # Totals for every run handled by this process (each gunicorn worker keeps its own)
+    return Response(REGISTRY.prometheus_text(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     # Local dev run
-    app.run(debug=True, port=8080)
+    app.run(debug=True, port=8080, threaded=True)
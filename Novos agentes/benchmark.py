@@ -0,0 +1,581 @@
+"""
+Benchmarks for the agent pipeline.
+
+    python benchmark.py                       # synthetic corpus -> JSON report on stdout
+    python benchmark.py --output run.json --compare baseline.json
+    python benchmark.py --parser-ab           # old vs new parser comparisons, CSV corpus and XLSX date checks
+    python benchmark.py --startup             # entry point import times vs budget (exit 1 on regression)
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from agent_organizer import OrganizerAgent
+
+NFE_NS = "http://www.portalfiscal.inf.br/nfe"
+
+def make_nfe_xml(file_path, items=500, rng=None):
+    """Writes a synthetic NFe (nfeProc-wrapped) with `items` det lines. Item values vary with `rng` (seeded Random)."""
+    det = []
+    totals = {'vProd': 0.0, 'vICMS': 0.0, 'vPIS': 0.0, 'vCOFINS': 0.0}
+    for i in range(1, items + 1):
+        v_prod = round(rng.uniform(1, 500), 2) if rng else 10.0
+        v_icms = round(v_prod * 0.18, 2)
+        v_pis = round(v_prod * 0.0165, 2)
+        v_cofins = round(v_prod * 0.076, 2)
+        totals['vProd'] += v_prod
+        totals['vICMS'] += v_icms
+        totals['vPIS'] += v_pis
+        totals['vCOFINS'] += v_cofins
+        det.append(
+            f'<det nItem="{i}"><prod><cProd>{i:06d}</cProd><xProd>Produto {i}</xProd>'
+            f'<NCM>84713012</NCM><CFOP>5102</CFOP><uCom>UN</uCom><qCom>1.0000</qCom>'
+            f'<vUnCom>{v_prod:.2f}</vUnCom><vProd>{v_prod:.2f}</vProd></prod>'
+            f'<imposto><ICMS><ICMS00><orig>0</orig><CST>00</CST><vBC>{v_prod:.2f}</vBC><pICMS>18.00</pICMS><vICMS>{v_icms:.2f}</vICMS></ICMS00></ICMS>'
+            f'<PIS><PISAliq><CST>01</CST><vBC>{v_prod:.2f}</vBC><pPIS>1.65</pPIS><vPIS>{v_pis:.2f}</vPIS></PISAliq></PIS>'
+            f'<COFINS><COFINSAliq><CST>01</CST><vBC>{v_prod:.2f}</vBC><pCOFINS>7.60</pCOFINS><vCOFINS>{v_cofins:.2f}</vCOFINS></COFINSAliq></COFINS>'
+            f'</imposto></det>'
+        )
+    xml = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<nfeProc xmlns="{NFE_NS}" versao="4.00"><NFe><infNFe Id="NFe{items}" versao="4.00">'
+        f'<ide><cUF>35</cUF><natOp>VENDA</natOp><mod>55</mod></ide>'
+        f'{"".join(det)}'
+        f'<total><ICMSTot><vBC>{totals["vProd"]:.2f}</vBC><vICMS>{totals["vICMS"]:.2f}</vICMS><vIPI>0.00</vIPI>'
+        f'<vPIS>{totals["vPIS"]:.2f}</vPIS><vCOFINS>{totals["vCOFINS"]:.2f}</vCOFINS>'
+        f'<vNF>{totals["vProd"]:.2f}</vNF><vTotTrib>0.00</vTotTrib></ICMSTot></total>'
+        f'<transp><modFrete>9</modFrete></transp>'
+        f'</infNFe></NFe><protNFe versao="4.00"><infProt><cStat>100</cStat></infProt></protNFe></nfeProc>'
+    )
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(xml)
+    return file_path
+
+def make_xlsx(file_path, rows=10000, rng=None):
+    """Writes a synthetic billing workbook: numeric 'Valor Total', PT-BR text 'Imposto', plus filler columns."""
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(['Cliente', 'Data', 'Descricao', 'Valor Total', 'Imposto', 'CFOP', 'NCM', 'Observacao'])
+    for i in range(rows):
+        value = round(rng.uniform(100, 5000), 2) if rng else 1000.0 + i % 100
+        sheet.append([f'Cliente {i}', '2025-01-31', f'Servico prestado {i}', value, _ptbr(value * 0.05),
+                      5102, 84713012, 'Sem observacoes'])
+    workbook.save(file_path)
+    return file_path
+
+XLSX_DATES = [datetime(2025, 1, 31), datetime(2024, 2, 29, 13, 45), datetime(1900, 1, 15)]
+
+def make_dated_xlsx(file_path, date1904=False):
+    """Writes a workbook whose first 'valor' column holds dates (built-in and dd/mm/yyyy formats), plus a boolean column."""
+    from openpyxl import Workbook
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904
+    workbook = Workbook()
+    if date1904:
+        workbook.epoch = CALENDAR_MAC_1904
+    sheet = workbook.active
+    sheet.append(['Data do Valor', 'Vencimento', 'Valor Total', 'Imposto', 'Pago'])
+    for i, day in enumerate(XLSX_DATES):
+        sheet.append([day, day, 1000.0 + i, _ptbr(50.0 + i), i % 2 == 0])
+        sheet.cell(row=i + 2, column=2).number_format = 'dd/mm/yyyy'
+    workbook.save(file_path)
+    return file_path
+
+def check_xlsx_dates():
+    """Asserts date cells stream back as datetimes (not serials), booleans as bool, and dates never count as amounts."""
+    import xlsx_stream
+    organizer = OrganizerAgent()
+    with tempfile.TemporaryDirectory() as tmp:
+        for date1904 in (False, True):
+            path = make_dated_xlsx(os.path.join(tmp, f"datas_{int(date1904)}.xlsx"), date1904)
+            values = xlsx_stream.read_columns(path, lambda header: range(len(header)))
+            assert values[0] == values[1] == XLSX_DATES, (values[0], values[1])
+            assert values[2] == [1000.0, 1001.0, 1002.0], values[2]
+            assert values[4] == [True, False, True], values[4]
+
+            # 'Data do Valor' is the first 'valor' column: its dates must sum to 0, as in the pandas parser
+            actual = organizer._parse_excel(path)
+            assert actual == organizer._parse_excel_pandas(path), f"{actual} != {organizer._parse_excel_pandas(path)}"
+            assert actual['Faturamento'] == 0.0, actual
+            print(f"XLSX dates (date1904={date1904}): OK")
+
+# Hand-written ISS statement variants covering the line rules of the CSV parser
+CSV_CORPUS = [
+    "Prefeitura Municipal;Extrato ISS\nCompetência;01/2025\nTotal Serviços;10.299,20\nTotal;10.299,20\nAlíquota 3,00%;308,98\nValor final do imposto;308,98\n",
+    "TOTAL GERAL;1.000,00;2.500,50\nIMPOSTO A RECOLHER;75,02\nVALOR RETIDO;10,00;12,50\n",
+    "Descricao;Valor\nAlíquota 5%;  1.029,92 \nValor retido;0,00\nTotal;-5,00;abc;20.000\n",
+    "Base;100\n% sobre base;2,5;3,5\nimposto a recolher;0\ntotal;,5;1.;.\n",
+    "Sem totais aqui;1,00\nOutra linha;2,00\r\nTotal;7,77\r\nValor Final do Imposto;1,11;2,22\r\n",
+    "Alíquota 2%\nAlíquota 3%;10,00;20,00\nTotal;1.000\n",
+    # Negatives, parenthesised or signed, never count: both parsers keep positive values only
+    "Total;(1.000,00);200,00\nValor retido;(5,00)\nImposto a recolher;-3,00;4,00\n",
+    "",
+]
+
+# Where _parse_csv is meant to differ from the baseline: (content, {field: new value}).
+# Currency cells: the baseline float() rejected "R$ 1.234,56" and read them as 0.
+CSV_INTENDED_DIFFERENCES = [
+    ("Total;R$ 1.234,56\nImposto a recolher;R$ 61,73\nValor retido;R$ 5,00\n",
+     {'Faturamento': 1234.56, 'Base Calculo': 1234.56, 'Impostos (Total)': 61.73, 'Retencoes': 5.0}),
+]
+
+def make_iss_csv(file_path, services=1000, rate=3.0, rng=None):
+    """Writes a synthetic municipal ISS statement: `services` detail lines (each with its rate) plus the summary lines."""
+    lines = ["Prefeitura Municipal;Extrato de ISS", "Competência;01/2025", "Nota;Tomador;Data;Valor Serviço;Base;Alíquota;ISS"]
+    total = 0.0
+    for i in range(services):
+        value = round(rng.uniform(100, 1000), 2) if rng else 100.0 + i % 900
+        total += value
+        lines.append(f"{i + 1};Tomador {i};15/01/2025;{_ptbr(value)};{_ptbr(value)};{_ptbr(rate)}%;{_ptbr(value * rate / 100)}")
+    lines += [
+        f"Total Serviços;{_ptbr(total)}",
+        f"Total;{_ptbr(total)}",
+        f"Alíquota {_ptbr(rate)}%;{_ptbr(total * rate / 100)}",
+        f"Valor retido;{_ptbr(total * 0.01)}",
+        f"Valor final do imposto;{_ptbr(total * (rate - 1) / 100)}",
+    ]
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    return file_path
+
+def _ptbr(value):
+    """1234.5 -> '1.234,50'"""
+    return f"{value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+# Reference implementations for the --parser-ab comparisons (no cache, no pool)
+_REFERENCE_ORGANIZER = OrganizerAgent(workers=1, cache_path="")
+
+def reference_parse_xml_dict(file_path):
+    """Full-tree NFe parser via xmltodict: the former OrganizerAgent XML parser, reference for the streaming one."""
+    import xmltodict
+    try:
+        with open(file_path, 'rb') as f:
+            doc = xmltodict.parse(f)
+        
+        # Navigate the potentially complex NFe structure. 
+        # Structure varies (NFe vs NFCe vs NFS-e), this is a generic attempt for NFe.
+        # Ideally, we look for key tags recursively or use known paths.
+        
+        # Simplified access attempting to find 'infNFe'
+        
+        # Try standard NFe path
+        nfe = doc.get('nfeProc', {}).get('NFe', {}).get('infNFe', {})
+        if not nfe:
+            nfe = doc.get('NFe', {}).get('infNFe', {})
+        
+        total = nfe.get('total', {}).get('ICMSTot', {})
+        retentions = nfe.get('total', {}).get('retTrib') or {}
+        return _REFERENCE_ORGANIZER._build_xml_row(total, retentions)
+    except Exception as e:
+        # print(f"XML Parse Error: {e}")
+        return None
+
+def _baseline_number(val_str):
+    """The original OrganizerAgent._parse_number, before ptbr_numbers: strip dots, comma to dot, float() or 0.0."""
+    if isinstance(val_str, (int, float)):
+        return float(val_str)
+    try:
+        return float(str(val_str).replace('.', '').replace(',', '.'))
+    except ValueError:
+        return 0.0
+
+def reference_parse_csv_lines(file_path):
+    """Line-by-line CSV parser: the former OrganizerAgent CSV parser, reference for _parse_csv (Aliquota always 0.0)."""
+    try:
+        # Read as text lines because it might not be a clean table
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            lines = f.readlines()
+        
+        faturamento = 0.0
+        impostos = 0.0
+        base_calc = 0.0
+        retencoes = 0.0
+        aliquota = 0.0
+
+        for line in lines:
+            line_lower = line.lower()
+            parts = line.split(';')
+            
+            # Check for Base de Calculo / Total
+            if 'total' in line_lower and 'serviços' not in line_lower: # Avoid "Total Serviços" duplications if listed twice
+                 # Look for the numeric part
+                 for part in parts:
+                     val = _baseline_number(part)
+                     if val > 0:
+                         # Heuristic: largest "Total" found could be Faturamento/Base
+                         if val > faturamento:
+                             faturamento = val
+                             base_calc = val
+
+            # Check for Taxes
+            if 'valor final do imposto' in line_lower or 'imposto a recolher' in line_lower:
+                for part in parts:
+                    val = _baseline_number(part)
+                    if val > 0:
+                        impostos = val
+            
+            # Check for Aliquota
+            if 'alíquota' in line_lower or '%' in line:
+                 for part in parts:
+                     val = _baseline_number(part)
+                     if val > 0:
+                         # This catches the calculated tax amount from the line "Aliquota X%; Value"
+                         # In the example CSV: "Alíquota 3,00%;1.029,92"
+                         # If we haven't found a "Final Tax", this is a good candidate
+                         if impostos == 0:
+                             impostos = val
+
+            # Check for Retentions
+            if 'valor retido' in line_lower:
+                for part in parts:
+                    val = _baseline_number(part)
+                    if val > 0:
+                        retencoes = val
+
+        return {
+            'Faturamento': faturamento,
+            'Impostos (Total)': impostos,
+            'Aliquota': 0.0, # Hard to parse exact rate from text easily without regex
+            'Base Calculo': base_calc,
+            'Retencoes': retencoes,
+            'Valor Liquido': faturamento - impostos - retencoes
+        }
+    except Exception as e:
+        print(f"CSV Parse Error: {e}")
+        return None
+
+def check_csv_corpus():
+    """
+    Asserts the streaming CSV parser matches the baseline line-by-line parser on the corpus (Aliquota aside),
+    except for the fields listed in CSV_INTENDED_DIFFERENCES.
+    """
+    organizer = OrganizerAgent()
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = []
+        for i, content in enumerate(CSV_CORPUS):
+            cases.append((f"corpus_{i}.csv", content, {}))
+        for i, (content, changes) in enumerate(CSV_INTENDED_DIFFERENCES):
+            cases.append((f"intended_{i}.csv", content, changes))
+
+        paths = []
+        for name, content, changes in cases:
+            path = os.path.join(tmp, name)
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(content)
+            paths.append((path, changes))
+        paths.append((make_iss_csv(os.path.join(tmp, "generated.csv"), 200), {}))
+
+        for path, changes in paths:
+            expected = reference_parse_csv_lines(path)
+            actual = organizer._parse_csv(path)
+            rate = actual.pop('Aliquota')
+            expected.pop('Aliquota')
+            if changes:
+                # An allow-list entry the baseline already agrees with no longer documents a difference
+                assert any(expected[field] != value for field, value in changes.items()), f"{os.path.basename(path)}: baseline gives {expected}"
+                expected.update(changes)
+                expected['Valor Liquido'] = expected['Faturamento'] - expected['Impostos (Total)'] - expected['Retencoes']
+            assert actual == expected, f"{os.path.basename(path)}: {actual} != {expected}"
+            print(f"CSV corpus {os.path.basename(path)}: OK (Aliquota {rate})")
+
+def _time_parser(parser, paths, repeat=3):
+    """Best-of-`repeat` wall time (seconds) to parse every path."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            parser(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_xml(item_counts=(10, 100, 1000, 5000), files=20):
+    """Compares the streaming NFe parser against the xmltodict full-tree parser."""
+    organizer = OrganizerAgent()
+    with tempfile.TemporaryDirectory() as tmp:
+        for items in item_counts:
+            paths = [make_nfe_xml(os.path.join(tmp, f"nfe_{items}_{i}.xml"), items) for i in range(files)]
+            assert organizer._parse_xml_stream(paths[0]) == reference_parse_xml_dict(paths[0])
+
+            t_dict = _time_parser(reference_parse_xml_dict, paths)
+            t_stream = _time_parser(organizer._parse_xml_stream, paths)
+            print(f"XML {items:>6} items x {files} files: xmltodict {t_dict * 1000:8.1f} ms | "
+                  f"stream {t_stream * 1000:8.1f} ms | speedup {t_dict / t_stream:5.1f}x")
+
+def bench_excel(row_counts=(1000, 10000, 100000), files=1):
+    """Compares the header-scan streaming Excel parser against the whole-sheet pandas parser."""
+    organizer = OrganizerAgent()
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            paths = [make_xlsx(os.path.join(tmp, f"planilha_{rows}_{i}.xlsx"), rows) for i in range(files)]
+            assert organizer._parse_excel(paths[0]) == organizer._parse_excel_pandas(paths[0])
+
+            t_pandas = _time_parser(organizer._parse_excel_pandas, paths, repeat=1)
+            t_stream = _time_parser(organizer._parse_excel, paths, repeat=1)
+            print(f"XLSX {rows:>7} rows x {files} files: pandas {t_pandas * 1000:9.1f} ms | "
+                  f"stream {t_stream * 1000:9.1f} ms | speedup {t_pandas / t_stream:5.1f}x")
+
+def bench_csv(line_counts=(1000, 10000, 100000), files=5):
+    """Compares the single-pass regex CSV parser against the line-by-line reference parser."""
+    organizer = OrganizerAgent()
+    with tempfile.TemporaryDirectory() as tmp:
+        for services in line_counts:
+            paths = [make_iss_csv(os.path.join(tmp, f"iss_{services}_{i}.csv"), services) for i in range(files)]
+            t_lines = _time_parser(reference_parse_csv_lines, paths)
+            t_regex = _time_parser(organizer._parse_csv, paths)
+            print(f"CSV {services:>7} lines x {files} files: lines {t_lines * 1000:8.1f} ms | "
+                  f"regex {t_regex * 1000:8.1f} ms | speedup {t_lines / t_regex:5.1f}x")
+
+def generate_corpus(folder, nfe=200, nfe_items=50, csv=20, csv_lines=2000, xlsx=5, xlsx_rows=5000, seed=42):
+    """Writes a reproducible mixed corpus (same seed, same bytes) and returns {'xml'|'csv'|'xlsx': [paths]}."""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    return {
+        'xml': [make_nfe_xml(os.path.join(folder, f"nfe_{i:05d}.xml"), nfe_items, rng) for i in range(nfe)],
+        'csv': [make_iss_csv(os.path.join(folder, f"iss_{i:04d}.csv"), csv_lines, rng=rng) for i in range(csv)],
+        'xlsx': [make_xlsx(os.path.join(folder, f"planilha_{i:03d}.xlsx"), xlsx_rows, rng) for i in range(xlsx)],
+    }
+
+def _peak_rss_mb():
+    """Peak resident set size of this process and of finished children (e.g. pool workers), in MB."""
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    # ru_maxrss is KB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+def _percentiles(samples, points=(50, 90, 95, 99)):
+    """Nearest-rank percentiles of latencies (seconds), reported in ms."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {f"p{p}": round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000, 3) for p in points}
+    result['max'] = round(ordered[-1] * 1000, 3)
+    result['mean'] = round(sum(ordered) / len(ordered) * 1000, 3)
+    return result
+
+def _throughput(files, total_bytes, seconds):
+    return {
+        'files': files,
+        'mb': round(total_bytes / 1e6, 3),
+        'seconds': round(seconds, 4),
+        'files_per_sec': round(files / seconds, 2) if seconds else None,
+        'mb_per_sec': round(total_bytes / 1e6 / seconds, 3) if seconds else None,
+    }
+
+def bench_parsers(corpus):
+    """Per-parser latency percentiles and throughput for _parse_xml, _parse_csv and _parse_excel."""
+    organizer = OrganizerAgent(workers=1, cache_path="")
+    parsers = {'xml': organizer._parse_xml, 'csv': organizer._parse_csv, 'xlsx': organizer._parse_excel}
+    results = {}
+    for kind, paths in corpus.items():
+        if not paths:
+            continue
+        latencies = []
+        for path in paths:
+            start = time.perf_counter()
+            parsers[kind](path)
+            latencies.append(time.perf_counter() - start)
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        results[parsers[kind].__name__] = {
+            **_throughput(len(paths), total_bytes, sum(latencies)),
+            'latency_ms': _percentiles(latencies),
+        }
+    return results
+
+def bench_organizer(corpus, workers=1):
+    """End-to-end OrganizerAgent.process_data throughput over the whole corpus (no cache)."""
+    paths = [path for kind_paths in corpus.values() for path in kind_paths]
+    files = [{'id': path, 'name': os.path.basename(path), 'local_path': path} for path in paths]
+    organizer = OrganizerAgent(workers=workers, cache_path="")
+    start = time.perf_counter()
+    df = organizer.process_data(files, logger_func=lambda msg: None)
+    elapsed = time.perf_counter() - start
+    return {
+        **_throughput(len(files), sum(os.path.getsize(path) for path in paths), elapsed),
+        'workers': organizer.workers,
+        'records': len(df),
+    }
+
+def bench_run_system(folder, pipeline=False):
+    """run_system on the corpus folder as a LOCAL source (no cache, no uploads)."""
+    from main import run_system
+    paths = [os.path.join(folder, name) for name in os.listdir(folder)]
+    previous_cache = os.environ.get("ORGANIZER_CACHE_PATH")
+    os.environ["ORGANIZER_CACHE_PATH"] = ""
+    try:
+        # Agents print some messages directly; keep stdout clean for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            start = time.perf_counter()
+            report = run_system(source_type="LOCAL", path_or_id=folder, export_local=True,
+                                logger_func=lambda msg: None, pipeline=pipeline, report_format="csv")
+            elapsed = time.perf_counter() - start
+    finally:
+        if previous_cache is None:
+            os.environ.pop("ORGANIZER_CACHE_PATH", None)
+        else:
+            os.environ["ORGANIZER_CACHE_PATH"] = previous_cache
+    if report.report_file and os.path.exists(report.report_file):
+        os.remove(report.report_file)
+    return {
+        **_throughput(len(paths), sum(os.path.getsize(path) for path in paths), elapsed),
+        'pipeline': pipeline,
+        'stages': report.metrics.get('stages', {}),
+    }
+
+# Entry points must import without these: they belong to the Drive/GitHub/Excel/Parquet paths only
+STARTUP_HEAVY_MODULES = ('pandas', 'numpy', 'googleapiclient', 'google_auth_oauthlib', 'github', 'xmltodict', 'pyarrow')
+# Cumulative import time budgets (ms), a few times the measured time so noisy machines don't trip them
+STARTUP_BUDGET_MS = {'main': 250, 'app': 500, 'gui': 300}
+# The only import failure the check tolerates: a Python built without Tk can't import the GUI
+STARTUP_OPTIONAL_IMPORTS = {'gui': ("No module named 'tkinter'", "No module named '_tkinter'")}
+
+def _import_profile(module):
+    """Runs `python -X importtime -c 'import module'` and returns {module name: cumulative us}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"import {module} failed")
+    profile = {}
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                profile[name.strip()] = int(cumulative)
+    return profile
+
+def bench_startup(modules=None, repeat=5):
+    """Import time of each entry point (best of `repeat` fresh interpreters) and heavy modules it pulls in."""
+    results = {}
+    for module in modules or STARTUP_BUDGET_MS:
+        try:
+            profiles = [_import_profile(module) for _ in range(repeat)]
+        except RuntimeError as e:
+            # A broken entry point is a regression; only a missing tkinter for the GUI is skipped
+            tolerated = any(reason in str(e) for reason in STARTUP_OPTIONAL_IMPORTS.get(module, ()))
+            results[module] = {'error': str(e), 'ok': tolerated}
+            continue
+        import_ms = min(profile.get(module, 0) for profile in profiles) / 1000
+        loaded = {name.split('.')[0] for name in profiles[0]}
+        heavy = sorted(loaded.intersection(STARTUP_HEAVY_MODULES))
+        budget = STARTUP_BUDGET_MS.get(module)
+        results[module] = {
+            'import_ms': round(import_ms, 1),
+            'budget_ms': budget,
+            'heavy_modules': heavy,
+            'ok': not heavy and (budget is None or import_ms <= budget),
+        }
+    return results
+
+def run_benchmark(nfe=200, nfe_items=50, csv=20, csv_lines=2000, xlsx=5, xlsx_rows=5000, seed=42, workers=1):
+    """Generates the corpus in a temp folder and returns the full results dict (JSON-serialisable)."""
+    params = {'nfe': nfe, 'nfe_items': nfe_items, 'csv': csv, 'csv_lines': csv_lines,
+              'xlsx': xlsx, 'xlsx_rows': xlsx_rows, 'seed': seed, 'workers': workers}
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        corpus = generate_corpus(tmp, nfe, nfe_items, csv, csv_lines, xlsx, xlsx_rows, seed)
+        generation_seconds = time.perf_counter() - start
+
+        results = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'params': params,
+                'corpus_generation_seconds': round(generation_seconds, 3),
+            },
+            'parsers': bench_parsers(corpus),
+            'organizer': bench_organizer(corpus, workers),
+            'run_system': bench_run_system(tmp, pipeline=False),
+            'run_system_pipeline': bench_run_system(tmp, pipeline=True),
+            'startup': bench_startup(repeat=3),
+        }
+        results['peak_rss_mb'] = _peak_rss_mb()
+    return results
+
+def compare_results(baseline, current):
+    """Prints throughput/latency ratios of `current` against `baseline` (> 1.0 means current is faster)."""
+    def ratio(old, new):
+        return f"{old / new:6.2f}x" if old and new else "   n/a"
+
+    for name, stats in current['parsers'].items():
+        old = baseline.get('parsers', {}).get(name)
+        if old:
+            print(f"{name:<16} files/s {ratio(stats['files_per_sec'], old['files_per_sec'])} | "
+                  f"p50 {ratio(old['latency_ms'].get('p50'), stats['latency_ms'].get('p50'))} | "
+                  f"p99 {ratio(old['latency_ms'].get('p99'), stats['latency_ms'].get('p99'))}")
+    for stage in ('organizer', 'run_system', 'run_system_pipeline'):
+        old = baseline.get(stage)
+        if old:
+            print(f"{stage:<20} seconds {ratio(old['seconds'], current[stage]['seconds'])}")
+    for module, stats in current.get('startup', {}).items():
+        old = baseline.get('startup', {}).get(module)
+        if old and old.get('import_ms') and stats.get('import_ms'):
+            print(f"import {module:<13} ms      {ratio(old['import_ms'], stats['import_ms'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent pipeline benchmark (synthetic NFe/CSV/XLSX corpus).")
+    parser.add_argument("--nfe", type=int, default=200, help="NFe XML files")
+    parser.add_argument("--nfe-items", type=int, default=50, help="det items per NFe")
+    parser.add_argument("--csv", type=int, default=20, help="ISS CSV statements")
+    parser.add_argument("--csv-lines", type=int, default=2000, help="detail lines per statement")
+    parser.add_argument("--xlsx", type=int, default=5, help="XLSX workbooks")
+    parser.add_argument("--xlsx-rows", type=int, default=5000, help="rows per workbook")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="OrganizerAgent workers (0 = all cores)")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON from a previous run to compare against")
+    parser.add_argument("--parser-ab", action="store_true", help="run the old-vs-new parser comparisons instead")
+    parser.add_argument("--startup", action="store_true", help="only check entry point import times and heavy imports")
+    args = parser.parse_args()
+
+    if args.startup:
+        results = bench_startup()
+        print(json.dumps(results, indent=2))
+        failed = [module for module, result in results.items() if not result['ok']]
+        if failed:
+            print(f"Startup regression: {', '.join(failed)}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.parser_ab:
+        bench_xml()
+        bench_excel()
+        check_xlsx_dates()
+        check_csv_corpus()
+        bench_csv()
+        return
+
+    results = run_benchmark(args.nfe, args.nfe_items, args.csv, args.csv_lines,
+                            args.xlsx, args.xlsx_rows, args.seed, args.workers)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_results(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
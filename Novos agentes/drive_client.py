@@ -0,0 +1,85 @@
+import os
+import threading
+
+# The Google client libraries take most of a cold start to import, so they are loaded
+# on first authentication rather than when the agents are imported
+
+# If modifying these scopes, delete the file token.json.
+SCOPES = ["https://www.googleapis.com/auth/drive"]
+
+# Drive answers rate limiting with 429 and transient failures with 5xx; both are worth retrying
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_creds = None
+_creds_lock = threading.Lock()
+# googleapiclient/httplib2 services are not thread-safe: one per thread, all sharing the credentials
+_local = threading.local()
+
+def _load_credentials():
+    """Service account (cloud) first, then the user token, refreshing or running the local OAuth flow if needed."""
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    creds = None
+
+    # 1. Try Service Account (Cloud Production)
+    if os.path.exists('service_account.json'):
+        try:
+            from google.oauth2 import service_account
+            creds = service_account.Credentials.from_service_account_file(
+                'service_account.json', scopes=SCOPES)
+            print("Drive Client: Authenticated with Service Account.")
+        except Exception as e:
+            print(f"Drive Client: Service Account Auth failed: {e}")
+
+    # 2. Key User Token (Local / Fallback)
+    if not creds and os.path.exists("token.json"):
+        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            try:
+                creds.refresh(Request())
+            except Exception:
+                creds = None
+
+        # Interactive flow (Only works locally)
+        if not creds and not os.path.exists('service_account.json'):
+            try:
+                flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+                creds = flow.run_local_server(port=0)
+                with open("token.json", "w") as token:
+                    token.write(creds.to_json())
+            except Exception:
+                print("Drive Client: Interactive auth failed (headless environment?)")
+    return creds
+
+def get_credentials(refresh=False):
+    """Process-wide Drive credentials, loaded once and shared by the reader and the exporter."""
+    global _creds
+    with _creds_lock:
+        if _creds is None or refresh:
+            _creds = _load_credentials()
+        elif not _creds.valid and getattr(_creds, "refresh_token", None):
+            # User tokens expire hourly; service accounts refresh themselves on the next request
+            from google.auth.transport.requests import Request
+            try:
+                _creds.refresh(Request())
+            except Exception as e:
+                print(f"Drive Client: Token refresh failed: {e}")
+        return _creds
+
+def get_service():
+    """Drive v3 service for the calling thread, built once per thread from the shared credentials."""
+    creds = get_credentials()
+    if getattr(_local, "service", None) is None or _local.creds is not creds:
+        from googleapiclient.discovery import build
+        _local.service = build("drive", "v3", credentials=creds, cache_discovery=False)
+        _local.creds = creds
+    return _local.service
+
+def reset():
+    """Drops the cached credentials (e.g. after token.json changed); services are rebuilt on next use."""
+    global _creds
+    with _creds_lock:
+        _creds = None
@@ -113,7 +113,7 @@ class AgentGUI:
                 logger_func=self.log
             )
             self.log(f"Finalizado: {result}")
-            if result == "Success":
+            if result.ok:
                 messagebox.showinfo("Sucesso", "Processamento concluído com sucesso!")
             else:
                 messagebox.showerror("Erro", "Ocorreu um erro durante o processamento.")
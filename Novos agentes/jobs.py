@@ -0,0 +1,151 @@
+import itertools
+import os
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+class QueueFull(Exception):
+    """Raised by JobManager.submit when every worker is busy and the wait queue is full."""
+
+class JobLog:
+    """
+    Append-only per-job log ring buffer. Every line gets a sequence number (1, 2, ...), so any number
+    of readers can follow it independently and resume after a reconnect; only the last max_lines
+    lines are kept (JOB_LOG_LINES, default 5000).
+    """
+    def __init__(self, max_lines=None):
+        self.lines = deque(maxlen=max_lines or int(os.getenv("JOB_LOG_LINES", "5000")))
+        self.last_seq = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def append(self, message):
+        with self.condition:
+            self.last_seq += 1
+            self.lines.append((self.last_seq, str(message)))
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def read_after(self, seq, timeout=None):
+        """
+        Returns (entries, dropped, closed): the (seq, line) entries after seq, waiting up to timeout
+        for new ones, and how many lines after seq already fell out of the buffer.
+        """
+        with self.condition:
+            if seq >= self.last_seq and not self.closed and timeout:
+                self.condition.wait(timeout)
+            if seq >= self.last_seq:
+                return [], 0, self.closed
+            first_seq = self.lines[0][0]
+            dropped = max(0, first_seq - seq - 1)
+            # Sequence numbers are contiguous, so the offset into the deque is direct
+            entries = list(itertools.islice(self.lines, max(0, seq - first_seq + 1), None))
+            return entries, dropped, self.closed
+
+class Job:
+    """One run_system call: its parameters, state, log buffer and result."""
+    def __init__(self, params, base_dir):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.work_dir = os.path.join(base_dir, self.id)
+        self.status = "queued"  # queued -> running -> finished | failed
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.log = JobLog()
+        self.report_path = None
+        self.report = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self.status in ("finished", "failed")
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'params': self.params,
+            'report_available': bool(self.report_path and os.path.exists(self.report_path)),
+            'report': self.report,
+            'error': self.error,
+            'last_log_seq': self.log.last_seq,
+        }
+
+class JobManager:
+    """
+    Runs jobs on a bounded thread pool. At most max_workers run at once and max_queued wait;
+    beyond that submit() raises QueueFull so callers can push back (HTTP 429).
+    Each job gets its own work folder for downloads and the report. Only the last `history`
+    finished jobs are kept; older ones are forgotten and their folders removed.
+    """
+    def __init__(self, run_func, max_workers=None, max_queued=None, history=None, base_dir=None):
+        self.run_func = run_func
+        self.max_workers = max_workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.max_queued = max_queued if max_queued is not None else int(os.getenv("JOB_QUEUE_SIZE", "8"))
+        self.history = history or int(os.getenv("JOB_HISTORY", "100"))
+        self.base_dir = base_dir or os.getenv("JOB_DIR", os.path.join(os.getcwd(), "jobs"))
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self.jobs = OrderedDict()
+        self.active = 0  # queued + running
+        self.lock = threading.Lock()
+
+    def submit(self, params):
+        """Queues a job and returns it. Raises QueueFull when there is no room."""
+        with self.lock:
+            if self.active >= self.max_workers + self.max_queued:
+                raise QueueFull(f"{self.active} jobs already queued or running")
+            self.active += 1
+            job = Job(params, self.base_dir)
+            self.jobs[job.id] = job
+        self.pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def _run(self, job):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            os.makedirs(job.work_dir, exist_ok=True)
+            result = self.run_func(job)
+            job.report = result.to_dict()
+            if result.report_file and os.path.exists(result.report_file):
+                job.report_path = result.report_file
+            job.status = "finished" if result.ok else "failed"
+            if not result.ok:
+                job.error = result.status
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            job.log.append(f"CRITICAL ERROR: {e}")
+            job.log.append(traceback.format_exc())
+        finally:
+            job.finished = time.time()
+            job.log.close()
+            with self.lock:
+                self.active -= 1
+                self._prune()
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.done]
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job.id]
+            shutil.rmtree(job.work_dir, ignore_errors=True)
@@ -1,10 +1,85 @@
 from agent_reader import ReaderAgent
-from agent_organizer import OrganizerAgent
+from agent_organizer import OrganizerAgent, SUPPORTED_EXTENSIONS
 from agent_exporter import ExporterAgent
+from run_metrics import REGISTRY, RunMetrics, RunReport
 import os
+import queue
+import sys
+import threading
+import time
 from dotenv import load_dotenv
 
-def run_system(source_type=None, path_or_id=None, export_local=True, export_drive=False, export_github=False, logger_func=print):
+_STAGE_DONE = object()
+
+def _bounded_stage(iterable, maxsize, put_timeout=0.5):
+    """
+    Runs an iterable in a background thread and yields its items through a bounded queue,
+    so the producing stage keeps working (up to maxsize items ahead) while the consumer is busy.
+    If the consumer stops early (error or close), the producer notices within put_timeout and exits.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        """Blocks until the item is queued; False if the consumer has stopped."""
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=put_timeout)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_STAGE_DONE)
+        except Exception as e:
+            put(e)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is _STAGE_DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+def _env_list(name, default=""):
+    """Comma-separated env var as a list (empty items dropped)."""
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+def _local_options():
+    """Local walker settings from .env. Only supported files are listed; the report itself is excluded so re-runs don't parse it."""
+    max_depth = os.getenv("LOCAL_MAX_DEPTH")
+    return {
+        'recursive': os.getenv("LOCAL_RECURSIVE", "false").lower() == "true",
+        'max_depth': int(max_depth) if max_depth else None,
+        'include': _env_list("LOCAL_INCLUDE"),
+        'exclude': _env_list("LOCAL_EXCLUDE", "relatorio_final.*,relatorio_itens.*"),
+        'extensions': SUPPORTED_EXTENSIONS,
+    }
+
+def _remember_xml(files, xml_files):
+    """Passes file entries through, keeping the XML ones in xml_files."""
+    for file_info in files:
+        if file_info['name'].lower().endswith('.xml'):
+            xml_files.append(file_info)
+        yield file_info
+
+def _count_listed(files, metrics):
+    """Passes listed files through, counting them (the Drive listing is a stream)."""
+    for file_info in files:
+        metrics.incr('files_listed')
+        yield file_info
+
+def run_system(source_type=None, path_or_id=None, export_local=True, export_drive=False, export_github=False, logger_func=print, pipeline=None, report_format=None, output_path=None, download_dir=None, item_details=None):
     """
     Runs the full agent pipeline.
     :param source_type: 'DRIVE' or 'LOCAL'.
@@ -12,12 +87,31 @@ def run_system(source_type=None, path_or_id=None, export_local=True, export_driv
     :param export_local: Boolean, save to disk.
     :param export_drive: Boolean, save to Drive (same folder as source if Drive, or root).
     :param logger_func: Function to handle logs.
+    :param pipeline: Boolean, stream files through read -> organize -> export stages over bounded
+        queues instead of finishing each step for the whole batch (default PIPELINE_MODE env).
+    :param report_format: 'csv', 'parquet' or 'arrow' (default REPORT_FORMAT env, else 'csv').
+    :param output_path: Report file path (default relatorio_final.<format> in the local source folder or cwd).
+    :param download_dir: Folder for Drive downloads (default ./temp_downloads).
+    :param item_details: Boolean, also write the NFe item-level table (relatorio_itens.<format>, next to
+        the report) with per-item ICMS/IPI/PIS/COFINS and rates (default NFE_ITEM_DETAILS env).
+    :return: RunReport with the status, the report path and per-stage/per-parser metrics.
+        Metrics are also logged as JSON lines (METRICS_JSON_LOGS=false turns that off)
+        and added to the process-wide REGISTRY served by the web app's /metrics.
     """
     # Helper to log messages
     def log(msg):
         logger_func(msg)
 
     load_dotenv()
+    json_logs = os.getenv("METRICS_JSON_LOGS", "true").lower() == "true"
+    metrics = RunMetrics(logger_func=log if json_logs else None)
+
+    def finish(status, report_file=None, item_report_file=None):
+        report = RunReport(status, report_file=report_file, metrics=metrics.snapshot(), source_type=source_type,
+                           item_report_file=item_report_file)
+        REGISTRY.record(report)
+        metrics.emit({'event': 'run_report', **report.to_dict()})
+        return report
     
     # Defaults from .env
     if not source_type:
@@ -27,6 +121,14 @@ def run_system(source_type=None, path_or_id=None, export_local=True, export_driv
             path_or_id = os.getenv("LOCAL_FOLDER_PATH", "./input_data")
         else:
             path_or_id = os.getenv("GOOGLE_DRIVE_FOLDER_ID")
+    if pipeline is None:
+        pipeline = os.getenv("PIPELINE_MODE", "false").lower() == "true"
+    queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+    if not report_format:
+        report_format = os.getenv("REPORT_FORMAT", "csv")
+    report_format = report_format.lower()
+    if item_details is None:
+        item_details = os.getenv("NFE_ITEM_DETAILS", "false").lower() == "true"
 
     # 1. Reader Agent
     log(f"--- STEP 1: READING ({source_type}) ---")
@@ -36,81 +138,145 @@ def run_system(source_type=None, path_or_id=None, export_local=True, export_driv
     if source_type == "DRIVE" or export_drive:
         # If exporting to Drive, we need auth even if reading from Local
         try:
-            reader.authenticate()
+            with metrics.stage("authenticate"):
+                reader.authenticate()
         except Exception as e:
             log(f"Authentication failed: {e}")
-            if source_type == "DRIVE": return "Auth Failed" # Critial if reading from Drive
+            if source_type == "DRIVE": return finish("auth_failed") # Critial if reading from Drive
             # If just exporting, maybe we can accept failure later, but safest is to fail auth.
 
     # List files
     if source_type == "DRIVE":
-        files = reader.list_files(folder_id=path_or_id, source_type="DRIVE")
         # [NEW] Download files for processing
-        log(f"Downloading {len(files)} files from Drive...")
-        download_count = 0
-        for f in files:
-            # Decide where to save. Temp folder?
-            temp_dir = os.path.join(os.getcwd(), "temp_downloads")
-            local_path = reader.download_file(f['id'], f['name'], temp_dir)
-            if local_path:
-                f['local_path'] = local_path
-                download_count += 1
-        log(f"Downloaded {download_count} files.")
+        # Listing is paginated and streamed: downloads start while later pages are still being listed
+        log("Listing and downloading files from Drive...")
+        recursive = os.getenv("DRIVE_RECURSIVE", "false").lower() == "true"
+        listing = reader.iter_drive_files(path_or_id, recursive=recursive, extensions=SUPPORTED_EXTENSIONS)
+        listing = _count_listed(metrics.timed_iter("list", listing), metrics)
+        # Decide where to save. Temp folder?
+        temp_dir = download_dir or os.path.join(os.getcwd(), "temp_downloads")
+        downloads = reader.iter_downloads(listing, temp_dir, logger_func=log, metrics=metrics)
+        if pipeline:
+            files = _bounded_stage(downloads, queue_size)
+        else:
+            files = list(downloads)
+            download_count = sum(1 for f in files if f.get('local_path'))
+            log(f"Downloaded {download_count} files.")
 
     else:
-        files = reader.list_files(override_path=path_or_id, source_type="LOCAL")
-        # For local, 'id' IS the path, but let's be explicit
-        for f in files:
-            f['local_path'] = f['id']
+        local_options = _local_options()
+        if pipeline:
+            # Entries stream into the organizer while the walk continues
+            listing = reader.iter_local_files(path_or_id, **local_options)
+            files = _count_listed(metrics.timed_iter("list", listing), metrics)
+        else:
+            with metrics.stage("list"):
+                files = reader.list_files(override_path=path_or_id, source_type="LOCAL", **local_options)
+            metrics.incr('files_listed', len(files))
     
-    if not files: log("No files found.")
+    if item_details and pipeline:
+        # The item pass re-reads the XMLs after the summary; remember them as they stream by
+        xml_files = []
+        files = _remember_xml(files, xml_files)
 
-    log(f"Found {len(files)} files/records.")
+    if not pipeline:
+        if not files: log("No files found.")
 
-    # 2. Organizer Agent
-    log("\n--- STEP 2: ORGANIZING ---")
-    organizer = OrganizerAgent()
-    processed_df = organizer.process_data(files, logger_func=log)
+        log(f"Found {len(files)} files/records.")
 
-    # 3. Exporter Agent
-    log("\n--- STEP 3: EXPORTING ---")
+    # Parsed rows are cached on disk so re-runs only parse new or changed files (empty path disables)
+    organizer = OrganizerAgent(cache_path=os.getenv("ORGANIZER_CACHE_PATH", "organizer_cache.db"), metrics=metrics)
     exporter = ExporterAgent()
-    
-    csv_file = None
-    
+
     # Determine Output Path
     # If Local Source and Export Local, save in source folder.
     # Otherwise/Default, save in current working directory.
-    filename = "relatorio_final.csv"
-    if source_type == "LOCAL" and path_or_id and os.path.isdir(path_or_id):
+    filename = f"relatorio_final.{report_format}"
+    if output_path:
+        pass
+    elif source_type == "LOCAL" and path_or_id and os.path.isdir(path_or_id):
         output_path = os.path.join(path_or_id, filename)
     else:
         output_path = filename
 
-    # Always create file (needed for upload)
-    csv_file = exporter.export_to_csv(processed_df, output_path)
-    
+    if pipeline:
+        # 2+3. Organizer and Exporter run as streaming stages: each file is parsed as soon as it
+        # is downloaded and its row is appended to the report in batches
+        log("\n--- STEP 2/3: ORGANIZING + EXPORTING (PIPELINE) ---")
+        writer = exporter.open_report_writer(output_path)
+        try:
+            # Stages overlap here: 'organize' is the parse stage's busy time, 'export' the writer's
+            rows = metrics.timed_iter("organize", organizer.iter_rows(files, logger_func=log))
+            rows = _bounded_stage(rows, queue_size)
+            with metrics.stage("export"):
+                writer.write_rows(rows)
+        finally:
+            report_file = writer.close()
+        if not report_file:
+            log("No files found.")
+    else:
+        # 2. Organizer Agent
+        log("\n--- STEP 2: ORGANIZING ---")
+        with metrics.stage("organize"):
+            processed_df = organizer.process_data(files, logger_func=log)
+
+        # 3. Exporter Agent
+        log("\n--- STEP 3: EXPORTING ---")
+
+        # Always create file (needed for upload)
+        with metrics.stage("export"):
+            report_file = exporter.export_dataframe(processed_df, output_path)
+
+    item_report_file = None
+    if item_details:
+        log("\n--- STEP 3b: NFE ITEMS ---")
+        # Same folder and format as the main report (an explicit output_path may not match report_format)
+        item_extension = os.path.splitext(output_path)[1]
+        item_path = os.path.join(os.path.dirname(output_path), f"relatorio_itens{item_extension}")
+        from agent_organizer import NFE_ITEM_COLS, NFE_ITEM_TEXT_COLS
+        item_writer = exporter.open_report_writer(item_path, columns=NFE_ITEM_COLS, text_columns=NFE_ITEM_TEXT_COLS)
+        try:
+            with metrics.stage("items"):
+                item_writer.write_rows(organizer.iter_item_rows(xml_files if pipeline else files, logger_func=log))
+        finally:
+            item_report_file = item_writer.close()
+        if item_report_file:
+            log(f"Item table saved to: {item_report_file}")
+
     if export_local:
-        log(f"Saved locally to: {csv_file}")
+        log(f"Saved locally to: {report_file}")
     
     # Drive Export
     if export_drive:
-        if csv_file:
+        if report_file:
             log("Uploading to Google Drive...")
             # If source was Drive, upload to same folder? Or explicit ID?
             # For now, let's use path_or_id if source was Drive, else None (Root)
             dest_id = path_or_id if source_type == "DRIVE" else None
-            exporter.upload_to_drive(csv_file, folder_id=dest_id)
+            with metrics.stage("upload_drive"):
+                exporter.upload_to_drive(report_file, folder_id=dest_id)
+                if item_report_file:
+                    exporter.upload_to_drive(item_report_file, folder_id=dest_id)
             log("Uploaded to Drive.")
     
     # GitHub Export (Optional - Env Controlled + GUI Flag)
     github_token = os.getenv("GITHUB_TOKEN")
     if export_github and github_token:
         log("Connecting to GitHub...")
-        exporter.connect_github()
-        if csv_file:
-            exporter.upload_to_github(csv_file)
-            log("Uploaded to GitHub.")
+        with metrics.stage("upload_github"):
+            exporter.connect_github()
+            if report_file and os.getenv("GITHUB_UPLOAD_MODE", "file").lower() == "commit":
+                # Report + run report (metrics so far) in a single commit
+                run_report_path = f"{os.path.splitext(report_file)[0]}_run.json"
+                with open(run_report_path, "w", encoding="utf-8") as f:
+                    f.write(RunReport("success", report_file, metrics.snapshot(), source_type).to_json())
+                # The run report's timings change every run: it only rides along with a changed report
+                result = exporter.upload_files_to_github([path for path in (report_file, item_report_file) if path],
+                                                         companion_paths=[run_report_path])
+                log(f"GitHub commit: {result}" if result else "GitHub: no changes to commit.")
+            elif report_file:
+                result = exporter.upload_to_github(report_file)
+                log(f"GitHub upload: {result}.")
     elif export_github and not github_token:
         log("GitHub Export requested but GITHUB_TOKEN not found in .env")
     else:
@@ -119,10 +285,95 @@ def run_system(source_type=None, path_or_id=None, export_local=True, export_driv
 
     log("--- EXECUTION FINISHED ---")
     log("--- EXECUTION FINISHED ---")
-    return csv_file
+    return finish("success" if report_file else "no_files", report_file, item_report_file)
+
+def watch_system(path_or_id=None, logger_func=print, report_format=None, output_path=None, debounce=None, max_delay=None, stop_event=None):
+    """
+    Long-running watch mode for a LOCAL folder: parses everything once, then only files that are
+    added or modified (deleted files drop out), keeping the report updated in place.
+    Report writes are debounced: they happen once changes have been quiet for `debounce` seconds,
+    or at most `max_delay` seconds after the first pending change, and replace the file atomically.
+    :param debounce: Default WATCH_DEBOUNCE env or 2 seconds.
+    :param max_delay: Default WATCH_MAX_DELAY env or 30 seconds.
+    :param stop_event: threading.Event that ends the loop (Ctrl+C also does).
+    """
+    from watcher import FolderWatcher
+
+    def log(msg):
+        logger_func(msg)
+
+    load_dotenv()
+    folder = path_or_id or os.getenv("LOCAL_FOLDER_PATH", "./input_data")
+    if not os.path.isdir(folder):
+        log(f"Watch: folder '{folder}' does not exist.")
+        return None
+    report_format = (report_format or os.getenv("REPORT_FORMAT", "csv")).lower()
+    output_path = output_path or os.path.join(folder, f"relatorio_final.{report_format}")
+    debounce = debounce if debounce is not None else float(os.getenv("WATCH_DEBOUNCE", "2"))
+    max_delay = max_delay if max_delay is not None else float(os.getenv("WATCH_MAX_DELAY", "30"))
+    stop_event = stop_event or threading.Event()
+
+    base, extension = os.path.splitext(output_path)
+    temp_path = f"{base}.tmp{extension}"
+    local_options = _local_options()
+    # Never pick up our own output
+    local_options['exclude'] += [os.path.basename(output_path), os.path.basename(temp_path)]
+
+    reader = ReaderAgent()
+    organizer = OrganizerAgent(cache_path=os.getenv("ORGANIZER_CACHE_PATH", "organizer_cache.db"))
+    exporter = ExporterAgent()
+    watcher = FolderWatcher(reader, folder, **local_options)
+    rows = {}  # file path -> row (None when the file has no data)
+
+    def apply(changed, deleted):
+        for path in deleted:
+            rows.pop(path, None)
+        for file_info, row in organizer.parse_entries(changed, logger_func=log):
+            rows[file_info['id']] = row
+
+    def write_report():
+        writer = exporter.open_report_writer(temp_path)
+        try:
+            writer.write_rows(rows[path] for path in sorted(rows) if rows[path])
+        finally:
+            written = writer.close()
+        if written:
+            os.replace(temp_path, output_path)
+            log(f"Watch: report updated ({sum(1 for row in rows.values() if row)} records): {output_path}")
+        elif os.path.exists(output_path):
+            os.remove(output_path)
+
+    log(f"--- WATCHING {folder} ({watcher.mode}) ---")
+    apply(watcher.initial_files(), ())
+    write_report()
+
+    first_change = last_change = None
+    try:
+        while not stop_event.is_set():
+            changed, deleted = watcher.poll(timeout=min(1.0, debounce) if first_change else 5.0)
+            now = time.monotonic()
+            if changed or deleted:
+                log(f"Watch: {len(changed)} new/modified, {len(deleted)} removed.")
+                apply(changed, deleted)
+                first_change = first_change or now
+                last_change = now
+            if first_change and (now - last_change >= debounce or now - first_change >= max_delay):
+                write_report()
+                first_change = last_change = None
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        if first_change:
+            write_report()
+        log("--- WATCH STOPPED ---")
+    return output_path
 
 def main():
-    # CLI Entry point
+    # CLI Entry point: `python main.py` runs once, `python main.py --watch [folder]` keeps a LOCAL folder's report current
+    if len(sys.argv) > 1 and sys.argv[1] == "--watch":
+        watch_system(sys.argv[2] if len(sys.argv) > 2 else None)
+        return
     run_system()
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+class ParseCache:
+    """
+    Persistent cache of OrganizerAgent rows, keyed by file content hash and parser version.
+    Files are matched by path + size + mtime first, so unchanged files are never re-hashed;
+    when those differ (e.g. a fresh Drive download) the content hash decides.
+    """
+    def __init__(self, db_path, parser_version, max_entries=100000):
+        self.db_path = db_path
+        self.parser_version = str(parser_version)
+        self.max_entries = max_entries
+        # Pipeline mode hands the organizer (and its cache) to a stage thread.
+        # Autocommit: each write is its own short transaction, so concurrent jobs sharing the
+        # file never wait on another run's whole batch; WAL lets readers work during writes.
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS rows (
+                content_hash TEXT NOT NULL,
+                parser_version TEXT NOT NULL,
+                row TEXT,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, parser_version)
+            );
+            CREATE INDEX IF NOT EXISTS idx_rows_last_used ON rows (last_used);
+        """)
+
+    def file_hash(self, file_path, size=None, mtime_ns=None):
+        """
+        Returns the content hash of a file, reusing the stored one if size and mtime are unchanged.
+        size/mtime_ns may come from a directory scan, saving the stat here.
+        """
+        if size is None or mtime_ns is None:
+            st = os.stat(file_path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        path = os.path.abspath(file_path)
+        cached = self.conn.execute(
+            "SELECT content_hash FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, size, mtime_ns)
+        ).fetchone()
+        if cached:
+            return cached[0]
+
+        with open(file_path, 'rb') as f:
+            content_hash = hashlib.file_digest(f, 'sha256').hexdigest()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+            (path, size, mtime_ns, content_hash)
+        )
+        return content_hash
+
+    def get(self, content_hash):
+        """Returns (found, row). A found row may be None for files the parser rejected."""
+        cached = self.conn.execute(
+            "SELECT row FROM rows WHERE content_hash = ? AND parser_version = ?",
+            (content_hash, self.parser_version)
+        ).fetchone()
+        if not cached:
+            return False, None
+
+        self.conn.execute(
+            "UPDATE rows SET last_used = ? WHERE content_hash = ? AND parser_version = ?",
+            (time.time(), content_hash, self.parser_version)
+        )
+        return True, json.loads(cached[0])
+
+    def put(self, content_hash, row):
+        """Stores the parsed row (or None) for a content hash."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO rows (content_hash, parser_version, row, last_used) VALUES (?, ?, ?, ?)",
+            (content_hash, self.parser_version, json.dumps(row, default=float), time.time())
+        )
+
+    def commit(self):
+        """
+        Evicts least recently used rows beyond max_entries and forgets paths that no longer exist
+        (writes are already committed).
+        """
+        self.conn.execute(
+            "DELETE FROM rows WHERE rowid IN ("
+            " SELECT rowid FROM rows ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        # Path entries whose content no longer has a cached row only cost a re-hash
+        self.conn.execute(
+            "DELETE FROM files WHERE content_hash NOT IN (SELECT content_hash FROM rows)"
+        )
+        # Every web job downloads into its own folder, removed once the job leaves the history:
+        # without this, each job would leave one path entry per file behind for good
+        missing = [(path,) for (path,) in self.conn.execute("SELECT path FROM files") if not os.path.exists(path)]
+        if missing:
+            # One transaction for the batch: autocommit would sync once per deleted path
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("DELETE FROM files WHERE path = ?", missing)
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,73 @@
+import math
+import re
+
+def _number_pattern(allow_percent):
+    """
+    PT-BR number: optional sign / 'R$' / enclosing parentheses (negative), digits with '.' thousands
+    separators and ',' decimal point, and optionally a trailing '%'.
+    Dots are accepted anywhere in the digits, matching the historical "drop every dot" rule.
+    """
+    percent = r'(?P<pct>%)?\s*' if allow_percent else ''
+    return (
+        r'(?P<open>\()?\s*(?P<sign>[+-])?\s*(?:R\$)?\s*(?P<sign2>[+-])?\s*'
+        r'(?P<num>[\d.]*\d[\d.]*(?:,[\d.]*)?|[\d.]*,[\d.]*\d[\d.]*)\s*'
+        + percent +
+        r'(?(open)\))'
+    )
+
+NUMBER_RE = re.compile(r'\s*' + _number_pattern(True) + r'\s*')
+NUMBER_NO_PERCENT_RE = re.compile(r'\s*' + _number_pattern(False) + r'\s*')
+# A whole ';'-separated cell holding a number (percentages excluded: they are rates, not amounts)
+CELL_NUMBER_RE = re.compile(r'(?:^|;)\s*' + _number_pattern(False) + r'\s*(?=;|$)')
+
+def _to_float(match):
+    # The pattern guarantees a valid float literal once dots are dropped and the comma becomes the point
+    opened, sign, sign2, digits = match.group('open', 'sign', 'sign2', 'num')
+    value = float(digits.replace('.', '').replace(',', '.'))
+    return -value if opened or sign == '-' or sign2 == '-' else value
+
+def parse_number(value, allow_percent=True):
+    """
+    Converts a PT-BR number ('1.234,56', 'R$ -10,00', '(5,00)', '3,00%') to float.
+    Percentages keep their face value ('3,00%' -> 3.0). Returns None for anything that isn't a number.
+    """
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else float(value)
+    if not isinstance(value, str):
+        return None
+
+    match = (NUMBER_RE if allow_percent else NUMBER_NO_PERCENT_RE).fullmatch(value)
+    return _to_float(match) if match else None
+
+def iter_cell_numbers(line):
+    """Yields the numbers found in the ';' cells of a text line, in order (percent cells are skipped)."""
+    for match in CELL_NUMBER_RE.finditer(line):
+        yield _to_float(match)
+
+def parse_number_series(series, allow_percent=True):
+    """
+    Vectorized parse_number for a pandas Series: numeric values are kept, text is parsed as PT-BR,
+    anything else becomes NaN. Returns a float64 Series with the same index.
+    """
+    import pandas as pd  # only the vectorized path needs pandas
+    series = pd.Series(series)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64')
+    if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_timedelta64_dtype(series):
+        # Dates aren't amounts: to_numeric would turn them into epoch nanoseconds
+        return pd.Series(float('nan'), index=series.index, dtype='float64')
+
+    is_text = series.map(lambda v: isinstance(v, str)).astype(bool)
+    result = pd.to_numeric(series.where(~is_text), errors='coerce').astype('float64')
+    if not is_text.any():
+        return result
+
+    pattern = NUMBER_RE if allow_percent else NUMBER_NO_PERCENT_RE
+    parts = series[is_text].str.extract('^' + pattern.pattern + '$')
+    values = pd.to_numeric(
+        parts['num'].str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
+        errors='coerce'
+    )
+    negative = parts['open'].notna() | parts['sign'].eq('-') | parts['sign2'].eq('-')
+    result[is_text] = values.where(~negative, -values)
+    return result
@@ -0,0 +1,176 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+class RunMetrics:
+    """
+    Timers and counters for one run_system call. Thread-safe: download workers and pipeline
+    stages record into the same instance.
+    Stage times are busy time (summed across threads), so overlapping pipeline stages can add up
+    to more than the wall-clock total.
+    """
+    def __init__(self, logger_func=None):
+        self.logger_func = logger_func
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {}    # name -> {'seconds', 'calls'}
+        self.counters = {}  # name -> int
+        self.parsers = {}   # parser type -> {'files', 'errors', 'cached', 'seconds', 'max_seconds'}
+
+    def add_time(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0})
+            entry['seconds'] += seconds
+            entry['calls'] += 1
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def stage(self, name):
+        """Times a block as one stage call and emits a JSON line when it ends."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.add_time(name, seconds)
+            self.emit({'event': 'stage', 'stage': name, 'seconds': round(seconds, 4)})
+
+    def timed_iter(self, stage, iterable):
+        """Yields from iterable, adding the time spent producing each item to the stage."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(stage, time.perf_counter() - start)
+                return
+            self.add_time(stage, time.perf_counter() - start)
+            yield item
+
+    def observe_parse(self, parser, seconds, error=False, cached=False):
+        """Records one file through a parser type ('xml', 'csv', 'xlsx', 'xls')."""
+        with self.lock:
+            entry = self.parsers.setdefault(parser, {'files': 0, 'errors': 0, 'cached': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            entry['files'] += 1
+            if error:
+                entry['errors'] += 1
+            if cached:
+                entry['cached'] += 1
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+
+    def emit(self, event):
+        """Sends one JSON line through the logger (no-op without one)."""
+        if self.logger_func:
+            self.logger_func(json.dumps(event, ensure_ascii=False))
+
+    def snapshot(self):
+        """Plain dict of everything recorded so far."""
+        with self.lock:
+            return {
+                'duration_seconds': round(time.time() - self.started, 4),
+                'stages': {name: {'seconds': round(v['seconds'], 4), 'calls': v['calls']} for name, v in self.stages.items()},
+                'counters': dict(self.counters),
+                'parsers': {name: {**v, 'seconds': round(v['seconds'], 4), 'max_seconds': round(v['max_seconds'], 4)}
+                            for name, v in self.parsers.items()},
+            }
+
+class RunReport:
+    """What run_system returns: outcome, report path and the run's metrics."""
+    def __init__(self, status, report_file=None, metrics=None, source_type=None, error=None, item_report_file=None):
+        self.status = status  # 'success', 'no_files', 'auth_failed'
+        self.report_file = report_file
+        self.item_report_file = item_report_file
+        self.metrics = metrics or {}
+        self.source_type = source_type
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.status == "success"
+
+    def to_dict(self):
+        return {
+            'status': self.status,
+            'report_file': self.report_file,
+            'item_report_file': self.item_report_file,
+            'source_type': self.source_type,
+            'error': self.error,
+            **self.metrics,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def __str__(self):
+        # Log-friendly: the report path when there is one, else the status
+        return str(self.report_file or self.status)
+
+class MetricsRegistry:
+    """Process-wide totals across runs, rendered in the Prometheus text exposition format."""
+    PREFIX = "agents"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.runs = {}          # status -> count
+        self.stage_seconds = {}
+        self.counters = {}
+        self.parsers = {}       # parser -> {'files', 'errors', 'cached', 'seconds'}
+        self.last_duration = 0.0
+        self.last_finished = 0.0
+
+    def record(self, report):
+        """Adds a finished RunReport to the totals."""
+        metrics = report.metrics
+        with self.lock:
+            self.runs[report.status] = self.runs.get(report.status, 0) + 1
+            for name, stage in metrics.get('stages', {}).items():
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + stage['seconds']
+            for name, value in metrics.get('counters', {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, parser in metrics.get('parsers', {}).items():
+                totals = self.parsers.setdefault(name, {'files': 0, 'errors': 0, 'cached': 0, 'seconds': 0.0})
+                for key in totals:
+                    totals[key] += parser[key]
+            self.last_duration = metrics.get('duration_seconds', 0.0)
+            self.last_finished = time.time()
+
+    def prometheus_text(self):
+        p = self.PREFIX
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{p}_{name}{{{label_text}}} {value}" if label_text else f"{p}_{name} {value}")
+
+        with self.lock:
+            metric("runs_total", "counter", "Finished run_system calls by status.",
+                   [({'status': s}, n) for s, n in sorted(self.runs.items())])
+            metric("stage_seconds_total", "counter", "Busy time per pipeline stage.",
+                   [({'stage': s}, round(v, 6)) for s, v in sorted(self.stage_seconds.items())])
+            metric("events_total", "counter", "Files listed/downloaded/skipped/failed, cache hits, rows written, bytes downloaded.",
+                   [({'event': s}, n) for s, n in sorted(self.counters.items())])
+            metric("parse_files_total", "counter", "Files handled per parser type (cache hits included).",
+                   [({'parser': s}, v['files']) for s, v in sorted(self.parsers.items())])
+            metric("parse_errors_total", "counter", "Parser failures per parser type.",
+                   [({'parser': s}, v['errors']) for s, v in sorted(self.parsers.items())])
+            metric("parse_cached_total", "counter", "Rows served from the parse cache per parser type.",
+                   [({'parser': s}, v['cached']) for s, v in sorted(self.parsers.items())])
+            metric("parse_seconds_total", "counter", "Parse time per parser type.",
+                   [({'parser': s}, round(v['seconds'], 6)) for s, v in sorted(self.parsers.items())])
+            metric("last_run_duration_seconds", "gauge", "Wall-clock duration of the last run.",
+                   [({}, round(self.last_duration, 6))])
+            metric("last_run_finished_timestamp_seconds", "gauge", "Unix time the last run finished.",
+                   [({}, round(self.last_finished, 3))])
+        return "\n".join(lines) + "\n"
+
+# Shared by every run in this process (the web app's /metrics reads it)
+REGISTRY = MetricsRegistry()
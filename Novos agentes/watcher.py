@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+# Event types that don't change a file's content
+IGNORED_EVENTS = {'opened', 'closed_no_write'}
+
+class FolderWatcher:
+    """
+    Detects new, modified and deleted files under a LOCAL folder, with the same filters as
+    ReaderAgent.iter_local_files. Uses filesystem events (watchdog: inotify / FSEvents /
+    ReadDirectoryChangesW) when the package is installed, so only touched paths are checked;
+    otherwise polls the folder with the scandir walker and compares size + mtime.
+    """
+    def __init__(self, reader, folder, poll_interval=None, use_events=None, **local_options):
+        self.reader = reader
+        self.folder = folder
+        self.local_options = local_options
+        self.poll_interval = poll_interval or float(os.getenv("WATCH_POLL_INTERVAL", "2"))
+        self.known = {}  # path -> (size, mtime_ns)
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.dirty = set()
+        self.full_rescan = False
+        self.observer = None
+        if use_events is None:
+            use_events = os.getenv("WATCH_EVENTS", "true").lower() == "true"
+        if use_events:
+            self.observer = self._start_observer()
+
+    @property
+    def mode(self):
+        return "events" if self.observer else "polling"
+
+    def initial_files(self):
+        """Full scan: every wanted file, remembered as the baseline for later changes."""
+        entries = list(self.reader.iter_local_files(self.folder, **self.local_options))
+        self.known = {entry['id']: (entry['size'], entry['mtime_ns']) for entry in entries}
+        return entries
+
+    def poll(self, timeout):
+        """Waits up to timeout seconds for changes. Returns (new or modified entries, deleted paths)."""
+        if not self.observer:
+            time.sleep(min(timeout, self.poll_interval))
+            return self._diff(self.reader.iter_local_files(self.folder, **self.local_options))
+
+        self.wakeup.wait(timeout)
+        with self.lock:
+            self.wakeup.clear()
+            dirty, self.dirty = self.dirty, set()
+            full_rescan, self.full_rescan = self.full_rescan, False
+        if full_rescan:
+            # Folder created/moved/deleted: its files may not have produced events of their own
+            return self._diff(self.reader.iter_local_files(self.folder, **self.local_options))
+        return self._check_paths(dirty)
+
+    def stop(self):
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+
+    def _diff(self, entries):
+        changed = []
+        seen = set()
+        for entry in entries:
+            seen.add(entry['id'])
+            signature = (entry['size'], entry['mtime_ns'])
+            if self.known.get(entry['id']) != signature:
+                self.known[entry['id']] = signature
+                changed.append(entry)
+        deleted = set(self.known) - seen
+        for path in deleted:
+            del self.known[path]
+        return changed, deleted
+
+    def _check_paths(self, paths):
+        changed = []
+        deleted = set()
+        for path in paths:
+            entry = self.reader.local_file_entry(self.folder, path, **self.local_options)
+            if entry:
+                signature = (entry['size'], entry['mtime_ns'])
+                if self.known.get(entry['id']) != signature:
+                    self.known[entry['id']] = signature
+                    changed.append(entry)
+            else:
+                # Gone, or renamed/filtered out: forget it under the walker's id for that path
+                rel_path = os.path.relpath(path, self.folder)
+                known_id = os.path.join(self.folder, rel_path)
+                if known_id in self.known:
+                    del self.known[known_id]
+                    deleted.add(known_id)
+        return changed, deleted
+
+    def _start_observer(self):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in IGNORED_EVENTS:
+                    return
+                with watcher.lock:
+                    if event.is_directory:
+                        # A folder's own 'modified' only mirrors changes to its files
+                        if event.event_type != 'modified':
+                            watcher.full_rescan = True
+                    else:
+                        watcher.dirty.add(os.fsdecode(event.src_path))
+                        if getattr(event, 'dest_path', None):
+                            watcher.dirty.add(os.fsdecode(event.dest_path))
+                watcher.wakeup.set()
+
+        try:
+            observer = Observer()
+            observer.schedule(Handler(), self.folder, recursive=bool(self.local_options.get('recursive')))
+            observer.start()
+        except OSError as e:
+            # e.g. inotify watch limit reached: polling still works
+            print(f"Watcher: filesystem events unavailable ({e}), polling instead.")
+            return None
+        return observer
@@ -0,0 +1,175 @@
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from datetime import datetime, timedelta
+
+# SpreadsheetML namespaces: transitional (Excel default) and strict
+MAIN_NAMESPACES = ('http://schemas.openxmlformats.org/spreadsheetml/2006/main', 'http://purl.oclc.org/ooxml/spreadsheetml/main')
+REL_NAMESPACES = ('http://schemas.openxmlformats.org/officeDocument/2006/relationships', 'http://purl.oclc.org/ooxml/officeDocument/relationships')
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+def _tags(local_name):
+    return {f'{{{ns}}}{local_name}' for ns in MAIN_NAMESPACES}
+
+CELL_TAGS = _tags('c')
+ROW_TAGS = _tags('row')
+VALUE_TAGS = _tags('v')
+TEXT_TAGS = _tags('t')
+SHARED_STRING_TAGS = _tags('si')
+NUM_FMT_TAGS = _tags('numFmt')
+CELL_XFS_TAGS = _tags('cellXfs')
+XF_TAGS = _tags('xf')
+WORKBOOK_PR_TAGS = _tags('workbookPr')
+
+# Built-in number formats that display a date or time (ECMA-376 18.8.30, plus the CJK ones)
+BUILTIN_DATE_FORMATS = frozenset(list(range(14, 23)) + list(range(27, 37)) + list(range(45, 48)) + list(range(50, 59)))
+# Quoted text, escaped characters and [color]/[$locale] sections can't make a format a date one
+_FORMAT_LITERALS_RE = re.compile(r'"[^"]*"|\\.|\[[^\]]*\]')
+_DATE_CODES_RE = re.compile(r'[dmyhs]', re.IGNORECASE)
+
+EPOCH_1900 = datetime(1899, 12, 30)
+EPOCH_1904 = datetime(1904, 1, 1)
+
+_COLUMN_INDEXES = {}
+
+def _column_index(cell_ref):
+    """'AB12' -> 27 (0-based column index)."""
+    letters = cell_ref.rstrip('0123456789')
+    idx = _COLUMN_INDEXES.get(letters)
+    if idx is None:
+        idx = 0
+        for ch in letters:
+            idx = idx * 26 + (ord(ch) - 64)
+        idx -= 1
+        _COLUMN_INDEXES[letters] = idx
+    return idx
+
+def _first_sheet_path(archive, workbook):
+    """Resolves the first worksheet's part name through workbook.xml and its relationships."""
+    rel_id = None
+    for sheet in workbook.iter():
+        if sheet.tag.endswith('}sheet'):
+            rel_id = next((sheet.get(f'{{{ns}}}id') for ns in REL_NAMESPACES if sheet.get(f'{{{ns}}}id')), None)
+            break
+
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    return 'xl/worksheets/sheet1.xml'
+
+def _shared_strings(archive):
+    """Loads the shared string table (rich text runs concatenated)."""
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as f:
+        for event, elem in ET.iterparse(f):
+            if elem.tag in SHARED_STRING_TAGS:
+                strings.append(''.join(t.text or '' for t in elem.iter() if t.tag in TEXT_TAGS))
+                elem.clear()
+    return strings
+
+def _is_date_format(format_code):
+    """True if a custom number format code displays a date or time (e.g. 'dd/mm/yyyy', 'hh:mm')."""
+    return bool(_DATE_CODES_RE.search(_FORMAT_LITERALS_RE.sub('', format_code)))
+
+def _date_styles(archive):
+    """Indexes of the cell styles (the 's' attribute of a cell) whose number format is a date/time one."""
+    if 'xl/styles.xml' not in archive.namelist():
+        return frozenset()
+    styles = ET.fromstring(archive.read('xl/styles.xml'))
+    date_formats = set(BUILTIN_DATE_FORMATS)
+    for num_fmt in styles.iter():
+        if num_fmt.tag in NUM_FMT_TAGS and _is_date_format(num_fmt.get('formatCode', '')):
+            date_formats.add(int(num_fmt.get('numFmtId')))
+
+    cell_xfs = next((elem for elem in styles if elem.tag in CELL_XFS_TAGS), ())
+    return frozenset(idx for idx, xf in enumerate(elem for elem in cell_xfs if elem.tag in XF_TAGS)
+                     if int(xf.get('numFmtId', 0)) in date_formats)
+
+def _from_serial(serial, date1904=False):
+    """
+    Excel date serial -> datetime, rounded to the millisecond (a float day fraction can't hold 13:45 exactly).
+    The 1900 system keeps Excel's phantom 1900-02-29 out of the count.
+    """
+    if date1904:
+        epoch = EPOCH_1904
+    else:
+        epoch = EPOCH_1900
+        if 0 < serial < 60:
+            serial += 1
+    return epoch + timedelta(milliseconds=round(serial * 86400000))
+
+def read_columns(file_path, select_columns):
+    """
+    Streams the first worksheet of an .xlsx and returns only the columns picked from its header.
+    :param select_columns: Callable taking the header row (list of lowercased strings) and returning
+        the 0-based column indexes to load.
+    :return: dict {column index: list of cell values}, with numeric cells as float (datetime when the
+        cell's number format is a date one), text cells as str, boolean cells as bool and
+        empty/error cells as None.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        workbook_pr = next((elem for elem in workbook if elem.tag in WORKBOOK_PR_TAGS), None)
+        date1904 = workbook_pr is not None and workbook_pr.get('date1904', 'false').lower() in ('1', 'true')
+        date_styles = _date_styles(archive)
+        shared = None
+        header = None
+        targets = set()
+        values = {}
+
+        with archive.open(_first_sheet_path(archive, workbook)) as sheet:
+            row_cells = {}
+            next_col = 0
+            for event, elem in ET.iterparse(sheet):
+                tag = elem.tag
+                if tag in CELL_TAGS:
+                    ref = elem.get('r')
+                    col = _column_index(ref) if ref else next_col
+                    next_col = col + 1
+                    if header is not None and col not in targets:
+                        continue
+
+                    cell_type = elem.get('t', 'n')
+                    value = None
+                    if cell_type == 'inlineStr':
+                        value = ''.join(t.text or '' for t in elem.iter() if t.tag in TEXT_TAGS)
+                    else:
+                        raw = next((child.text for child in elem if child.tag in VALUE_TAGS), None)
+                        if raw is not None:
+                            if cell_type == 'n':
+                                value = float(raw)
+                                if date_styles and int(elem.get('s', 0)) in date_styles:
+                                    value = _from_serial(value, date1904)
+                            elif cell_type == 's':
+                                if shared is None:
+                                    shared = _shared_strings(archive)
+                                value = shared[int(raw)]
+                            elif cell_type == 'str':
+                                value = raw
+                            elif cell_type == 'b':
+                                value = raw == '1'
+                    row_cells[col] = value
+                elif tag in ROW_TAGS:
+                    if header is None:
+                        # First row is the header: decide which columns the rest of the scan keeps
+                        width = max(row_cells) + 1 if row_cells else 0
+                        header = [str(row_cells[i]).lower() if row_cells.get(i) is not None else '' for i in range(width)]
+                        targets = set(select_columns(header))
+                        values = {idx: [] for idx in targets}
+                        if not targets:
+                            break
+                    else:
+                        for idx in targets:
+                            values[idx].append(row_cells.get(idx))
+                    row_cells = {}
+                    next_col = 0
+                    elem.clear()
+
+        return values
@@ -1,8 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
-from ofxparse import OfxParser
+import numpy as np
 import pandas as pd
+import datetime
+import html
 import json
+import os
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
 from openpyxl import load_workbook
 
 # Classes de modelo
@@ -13,57 +24,778 @@ class Cliente:
         self.endereco = endereco
         self.valor = valor
 
+PAGO = "Pago"
+NAO_PAGO = "Não pago"
+
+def centavos(valor):
+    return int(round(float(valor or 0) * 100))
+
+class Pagamento:
+    """Um pagamento registrado: cliente, período (ano, mês), valor em centavos e a transação de origem."""
+    __slots__ = ("cliente_id", "ano", "mes", "centavos", "transacao_id", "data")
+
+    def __init__(self, cliente_id, ano, mes, centavos, transacao_id=None, data=None):
+        self.cliente_id = cliente_id
+        self.ano = ano
+        self.mes = mes
+        self.centavos = centavos
+        self.transacao_id = transacao_id
+        self.data = data
+
+    def para_lista(self):
+        return [self.cliente_id, self.mes, self.centavos, self.transacao_id, self.data.isoformat() if self.data else None]
+
+class MatrizPagamentos:
+    """
+    Visão de um ano: quantidade de pagamentos e centavos recebidos por célula (linha do cliente x
+    mês), em matrizes NumPy. Meses pagos e valor recebido por cliente e por mês ficam em cache e
+    são ajustados a cada registro ou estorno, sem recontar a matriz. Valores em centavos (int64),
+    para os totais não acumularem erro de arredondamento.
+    """
+    MESES = 12
+
+    def __init__(self, capacidade=1024):
+        self.quantidade = np.zeros((capacidade, self.MESES), dtype=np.int32)
+        self.recebido = np.zeros((capacidade, self.MESES), dtype=np.int64)
+        self.pagos_cliente = np.zeros(capacidade, dtype=np.int8)
+        self.recebido_cliente = np.zeros(capacidade, dtype=np.int64)
+        self.pagos_mes = np.zeros(self.MESES, dtype=np.int64)
+        self.recebido_mes = np.zeros(self.MESES, dtype=np.int64)
+
+    def registrar(self, linha, mes, valor_centavos):
+        self._garantir(linha)
+        coluna = mes - 1
+        if self.quantidade[linha, coluna] == 0:
+            self.pagos_cliente[linha] += 1
+            self.pagos_mes[coluna] += 1
+        self.quantidade[linha, coluna] += 1
+        self._somar(linha, coluna, valor_centavos)
+
+    def estornar(self, linha, mes, valor_centavos):
+        coluna = mes - 1
+        self.quantidade[linha, coluna] -= 1
+        if self.quantidade[linha, coluna] == 0:
+            self.pagos_cliente[linha] -= 1
+            self.pagos_mes[coluna] -= 1
+        self._somar(linha, coluna, -valor_centavos)
+
+    def limpar_linha(self, linha):
+        if linha >= len(self.pagos_cliente):
+            return
+        self.pagos_mes -= self.quantidade[linha] > 0
+        self.recebido_mes -= self.recebido[linha]
+        self.quantidade[linha] = 0
+        self.recebido[linha] = 0
+        self.pagos_cliente[linha] = 0
+        self.recebido_cliente[linha] = 0
+
+    def pago(self, linha, mes):
+        return linha < len(self.pagos_cliente) and bool(self.quantidade[linha, mes - 1])
+
+    def pagos(self, linha):
+        """12 booleanos, janeiro primeiro."""
+        if linha >= len(self.pagos_cliente):
+            return [False] * self.MESES
+        return (self.quantidade[linha] > 0).tolist()
+
+    def meses_pagos(self, linha):
+        return int(self.pagos_cliente[linha]) if linha < len(self.pagos_cliente) else 0
+
+    def total_cliente(self, linha):
+        return int(self.recebido_cliente[linha]) / 100 if linha < len(self.recebido_cliente) else 0.0
+
+    def total(self):
+        return int(self.recebido_mes.sum()) / 100
+
+    def _somar(self, linha, coluna, valor_centavos):
+        self.recebido[linha, coluna] += valor_centavos
+        self.recebido_cliente[linha] += valor_centavos
+        self.recebido_mes[coluna] += valor_centavos
+
+    def _garantir(self, linha):
+        capacidade = len(self.pagos_cliente)
+        if linha < capacidade:
+            return
+        while capacidade <= linha:
+            capacidade *= 2
+        for nome in ("quantidade", "recebido", "pagos_cliente", "recebido_cliente"):
+            antigo = getattr(self, nome)
+            novo = np.zeros((capacidade,) + antigo.shape[1:], dtype=antigo.dtype)
+            novo[:len(antigo)] = antigo
+            setattr(self, nome, novo)
+
+class LivroPagamentos:
+    """
+    Pagamentos por (ano, mês). Cada ano carregado tem seus registros, um índice por transação
+    (a mesma transação de OFX não entra duas vezes) e uma MatrizPagamentos com os agregados do
+    ano. Anos que só existem em disco são lidos na primeira vez que alguém consulta o ano.
+    """
+    def __init__(self, linha_de, ano=None):
+        self.linha_de = linha_de  # cliente_id -> linha na matriz, ou None se o cliente não existe mais
+        self.ano = ano or datetime.date.today().year  # ano exibido na tabela
+        self.anos = {}            # ano -> MatrizPagamentos
+        self.registros = {}       # ano -> {(cliente_id, mes): [Pagamento]}
+        self.transacoes = {}      # ano -> {transacao_id: Pagamento}
+        self.em_disco = set()     # anos salvos ainda não lidos
+        self.ler_ano = None       # ano -> [Pagamento]
+        self.alterados = set()    # anos com mudanças ainda não salvas
+
+    def usar_disco(self, anos, ler_ano):
+        """
+        Anos salvos, lidos com ler_ano(ano) só quando forem consultados. Um ano salvo que já foi
+        consultado sem alterações (a tela lê o ano exibido a cada evento) é descartado para ser
+        lido do disco; senão o próximo salvar gravaria a matriz vazia por cima do arquivo.
+        """
+        for ano in (set(anos) & set(self.anos)) - self.alterados:
+            del self.anos[ano], self.registros[ano], self.transacoes[ano]
+        self.em_disco = set(anos) - set(self.anos)
+        self.ler_ano = ler_ano
+
+    def matriz(self, ano):
+        """Visão do ano, lendo-o do disco na primeira consulta."""
+        if ano not in self.anos:
+            self.anos[ano] = MatrizPagamentos()
+            self.registros[ano] = {}
+            self.transacoes[ano] = {}
+            if ano in self.em_disco:
+                self.em_disco.discard(ano)
+                for pagamento in self.ler_ano(ano):
+                    self._incluir(pagamento)
+        return self.anos[ano]
+
+    def registrar(self, pagamento):
+        """Inclui o pagamento. Devolve False se a transação já estava no livro."""
+        self.matriz(pagamento.ano)
+        if pagamento.transacao_id and pagamento.transacao_id in self.transacoes[pagamento.ano]:
+            return False
+        if not self._incluir(pagamento):
+            return False
+        self.alterados.add(pagamento.ano)
+        return True
+
+    def remover(self, cliente_id, ano, mes):
+        """Estorna os pagamentos do cliente no mês. Devolve quantos eram."""
+        matriz = self.matriz(ano)
+        pagamentos = self.registros[ano].pop((cliente_id, mes), [])
+        linha = self.linha_de(cliente_id)
+        for pagamento in pagamentos:
+            matriz.estornar(linha, mes, pagamento.centavos)
+            if pagamento.transacao_id:
+                self.transacoes[ano].pop(pagamento.transacao_id, None)
+        if pagamentos:
+            self.alterados.add(ano)
+        return len(pagamentos)
+
+    def remover_cliente(self, cliente_id, linha):
+        """Tira o cliente dos anos carregados; nos anos em disco os registros dele caem ao carregar."""
+        for ano, matriz in self.anos.items():
+            for mes in range(1, 13):
+                for pagamento in self.registros[ano].pop((cliente_id, mes), []):
+                    if pagamento.transacao_id:
+                        self.transacoes[ano].pop(pagamento.transacao_id, None)
+                    self.alterados.add(ano)
+            matriz.limpar_linha(linha)
+
+    def pagamentos(self, inicio, fim):
+        """Pagamentos de inicio a fim, períodos (ano, mês) inclusive."""
+        for ano in self._anos_entre(inicio[0], fim[0]):
+            self.matriz(ano)
+            for (_, mes), pagamentos in self.registros[ano].items():
+                if inicio <= (ano, mes) <= fim:
+                    yield from pagamentos
+
+    def recebido(self, inicio, fim, cliente_id=None):
+        """Total recebido de inicio a fim (períodos (ano, mês) inclusive), de todos ou de um cliente."""
+        linha = self.linha_de(cliente_id) if cliente_id is not None else None
+        total = 0
+        for ano in self._anos_entre(inicio[0], fim[0]):
+            matriz = self.matriz(ano)
+            primeiro = inicio[1] if ano == inicio[0] else 1
+            ultimo = fim[1] if ano == fim[0] else 12
+            if cliente_id is None:
+                total += int(matriz.recebido_mes[primeiro - 1:ultimo].sum())
+            elif linha is not None and linha < len(matriz.recebido_cliente):
+                total += int(matriz.recebido[linha, primeiro - 1:ultimo].sum())
+        return total / 100
+
+    def anos_com_dados(self):
+        return sorted(self.em_disco | {ano for ano, registros in self.registros.items() if registros})
+
+    def _anos_entre(self, primeiro, ultimo):
+        # Só anos com dados: um intervalo longo não cria matrizes vazias
+        return [ano for ano in self.anos_com_dados() if primeiro <= ano <= ultimo]
+
+    def _incluir(self, pagamento):
+        linha = self.linha_de(pagamento.cliente_id)
+        if linha is None:
+            return False
+        ano = pagamento.ano
+        self.registros[ano].setdefault((pagamento.cliente_id, pagamento.mes), []).append(pagamento)
+        if pagamento.transacao_id:
+            self.transacoes[ano][pagamento.transacao_id] = pagamento
+        self.anos[ano].registrar(linha, pagamento.mes, pagamento.centavos)
+        return True
+
 class Recebimento:
-    def __init__(self, cliente):
+    """Pagamentos de um cliente no livro. As propriedades mostram o ano exibido (livro.ano)."""
+    def __init__(self, cliente, livro, linha):
         self.cliente = cliente
-        self.pagamentos = {mes: "Não pago" for mes in range(1, 13)}
+        self.livro = livro
+        self.linha = linha
+
+    @property
+    def pagamentos(self):
+        """Mês (1-12) -> "Pago"/"Não pago" no ano exibido, como a tabela mostra."""
+        return self.pagamentos_ano(self.livro.ano)
+
+    def pagamentos_ano(self, ano):
+        pagos = self.livro.matriz(ano).pagos(self.linha)
+        return {mes: PAGO if pago else NAO_PAGO for mes, pago in enumerate(pagos, 1)}
+
+    @property
+    def pagos(self):
+        return self.livro.matriz(self.livro.ano).meses_pagos(self.linha)
 
-    def marcar_pagamento(self, mes):
-        self.pagamentos[mes] = "Pago" if self.pagamentos[mes] == "Não pago" else "Não pago"
+    @property
+    def valor_total(self):
+        return self.livro.matriz(self.livro.ano).total_cliente(self.linha)
+
+    def pago(self, mes, ano=None):
+        return self.livro.matriz(ano or self.livro.ano).pago(self.linha, mes)
+
+    def marcar_pagamento(self, mes, ano=None, valor=None, transacao_id=None, data=None):
+        """
+        Registra um pagamento no mês (do ano exibido, se ano não for dado), pelo valor do cliente
+        se valor não for dado. Devolve False se a transação já estava registrada.
+        """
+        valor = self.cliente.valor if valor is None else valor
+        pagamento = Pagamento(self.cliente.id, ano or self.livro.ano, mes, centavos(valor), transacao_id, data)
+        return self.livro.registrar(pagamento)
+
+def normalizar_nome(nome):
+    """Nome como chave de índice: sem espaços nas pontas nem repetidos."""
+    return " ".join(str(nome or "").split())
+
+def chave_busca(nome):
+    """Nome normalizado, sem acentos e sem diferença entre maiúsculas e minúsculas."""
+    nome = normalizar_nome(nome)
+    if nome.isascii():
+        return nome.lower()
+    decomposto = unicodedata.normalize("NFKD", nome)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+class RepositorioClientes:
+    """
+    Clientes e recebimentos na ordem da tabela, com índices por id, por nome normalizado e por
+    chave de busca. Importação, carga e busca consultam os índices em vez de varrer a lista.
+    Toda alteração passa por aqui e gera um evento ("adicionados", "alterados", "removidos")
+    com os ids dos clientes para os ouvintes inscritos, como a grade da tela; trocar o ano
+    exibido gera "periodo". Os pagamentos ficam no LivroPagamentos, e cada cliente tem uma
+    linha fixa nas matrizes de todos os anos.
+    """
+    EVENTOS = ("adicionados", "alterados", "removidos")
+
+    def __init__(self):
+        self.clientes = []
+        self.recebimentos = []
+        self.por_id = {}     # id -> Recebimento
+        self.por_nome = {}   # nome normalizado -> [Cliente], na ordem de cadastro
+        self.por_busca = {}  # chave de busca -> [Cliente]
+        self.ultimo_id = 0
+        self.livro = LivroPagamentos(self.linha_de)
+        self.proxima_linha = 0
+        self.linhas_livres = []
+        self.ouvintes = []
+        self.pendentes = None  # evento -> ids, enquanto um lote estiver aberto
+        self.profundidade = 0
+
+    def inscrever(self, ouvinte):
+        """ouvinte(evento, ids) é chamado depois de cada alteração (ou de cada lote)."""
+        self.ouvintes.append(ouvinte)
+
+    @contextmanager
+    def lote(self):
+        """Junta as alterações do bloco num evento por tipo, emitidos quando o bloco termina."""
+        if self.profundidade == 0:
+            self.pendentes = {evento: {} for evento in self.EVENTOS}
+        self.profundidade += 1
+        try:
+            yield
+        finally:
+            self.profundidade -= 1
+            if self.profundidade == 0:
+                pendentes, self.pendentes = self.pendentes, None
+                for evento in self.EVENTOS:
+                    if pendentes[evento]:
+                        self._emitir(evento, list(pendentes[evento]))
+
+    def _notificar(self, evento, ids):
+        if self.pendentes is not None:
+            # dict como conjunto ordenado: um id aparece uma vez por evento
+            self.pendentes[evento].update(dict.fromkeys(ids))
+        else:
+            self._emitir(evento, list(ids))
+
+    def _emitir(self, evento, ids):
+        for ouvinte in self.ouvintes:
+            ouvinte(evento, ids)
+
+    def novo_id(self):
+        return self.ultimo_id + 1
+
+    def adicionar(self, cliente):
+        """Cadastra o cliente (com um id novo se o dele já existir) e devolve o recebimento."""
+        if cliente.id is None or cliente.id in self.por_id:
+            cliente.id = self.novo_id()
+        self.ultimo_id = max(self.ultimo_id, cliente.id)
+        if self.linhas_livres:
+            linha = self.linhas_livres.pop()
+        else:
+            linha = self.proxima_linha
+            self.proxima_linha += 1
+        recebimento = Recebimento(cliente, self.livro, linha)
+        self.clientes.append(cliente)
+        self.recebimentos.append(recebimento)
+        self.por_id[cliente.id] = recebimento
+        self._indexar(cliente)
+        self._notificar("adicionados", (cliente.id,))
+        return recebimento
+
+    def remover(self, cliente):
+        recebimento = self.por_id.pop(cliente.id)
+        self._liberar(recebimento)
+        self._desindexar(cliente)
+        self.clientes.remove(cliente)
+        self.recebimentos.remove(recebimento)
+        self._notificar("removidos", (cliente.id,))
+
+    def atualizar(self, cliente, nome, endereco, valor):
+        if nome != cliente.nome:
+            self._desindexar(cliente)
+            cliente.nome = nome
+            self._indexar(cliente)
+        cliente.endereco = endereco
+        cliente.valor = valor
+        self._notificar("alterados", (cliente.id,))
+
+    def registrar_pagamento(self, cliente_id, mes, ano=None, valor=None, transacao_id=None, data=None):
+        """Registra um pagamento (ver Recebimento.marcar_pagamento). Devolve False se a transação já existia."""
+        registrado = self.por_id[cliente_id].marcar_pagamento(mes, ano, valor, transacao_id, data)
+        if registrado:
+            self._notificar("alterados", (cliente_id,))
+        return registrado
+
+    def remover_pagamentos(self, cliente_id, ano, mes):
+        removidos = self.livro.remover(cliente_id, ano, mes)
+        if removidos:
+            self._notificar("alterados", (cliente_id,))
+        return removidos
+
+    def exibir_ano(self, ano):
+        """Troca o ano que a tabela mostra (lendo-o do disco, se preciso)."""
+        self.livro.ano = ano
+        self.livro.matriz(ano)
+        self._emitir("periodo", [])
+
+    def limpar(self):
+        """Esquece todos os clientes e pagamentos (antes de carregar outro arquivo)."""
+        ids = [c.id for c in self.clientes]
+        self.clientes.clear()
+        self.recebimentos.clear()
+        self.por_id.clear()
+        self.por_nome.clear()
+        self.por_busca.clear()
+        self.ultimo_id = 0
+        self.livro = LivroPagamentos(self.linha_de, self.livro.ano)
+        self.proxima_linha = 0
+        self.linhas_livres = []
+        if ids:
+            self._notificar("removidos", ids)
+
+    def recebimento(self, cliente_id):
+        return self.por_id.get(cliente_id)
+
+    def linha_de(self, cliente_id):
+        recebimento = self.por_id.get(cliente_id)
+        return recebimento.linha if recebimento else None
+
+    def cliente_por_nome(self, nome):
+        """Primeiro cliente cadastrado com esse nome (comparação exata após normalizar)."""
+        encontrados = self.por_nome.get(normalizar_nome(nome))
+        return encontrados[0] if encontrados else None
+
+    def buscar(self, nome):
+        """Clientes com esse nome, ignorando acentos e maiúsculas/minúsculas."""
+        return list(self.por_busca.get(chave_busca(nome), []))
+
+    def remover_duplicados(self):
+        """Mantém só o primeiro cliente de cada nome normalizado. Devolve quantos saíram."""
+        duplicados = [c for nome, lista in self.por_nome.items() for c in lista[1:]]
+        if not duplicados:
+            return 0
+        removidos = {c.id for c in duplicados}
+        for cliente in duplicados:
+            self._liberar(self.por_id.pop(cliente.id))
+            self._desindexar(cliente)
+        self.clientes[:] = [c for c in self.clientes if c.id not in removidos]
+        self.recebimentos[:] = [r for r in self.recebimentos if r.cliente.id not in removidos]
+        self._notificar("removidos", removidos)
+        return len(duplicados)
+
+    def _liberar(self, recebimento):
+        self.livro.remover_cliente(recebimento.cliente.id, recebimento.linha)
+        self.linhas_livres.append(recebimento.linha)
+
+    def _indexar(self, cliente):
+        self.por_nome.setdefault(normalizar_nome(cliente.nome), []).append(cliente)
+        self.por_busca.setdefault(chave_busca(cliente.nome), []).append(cliente)
+
+    def _desindexar(self, cliente):
+        for indice, chave in ((self.por_nome, normalizar_nome(cliente.nome)), (self.por_busca, chave_busca(cliente.nome))):
+            lista = indice.get(chave, [])
+            if cliente in lista:
+                lista.remove(cliente)
+            if not lista:
+                indice.pop(chave, None)
 
 # Funções auxiliares
+def valores_linha(recebimento):
+    cliente = recebimento.cliente
+    valor = cliente.valor if cliente.valor is not None else 0.0
+    return (cliente.nome, f"R$ {valor:,.2f}", *recebimento.pagamentos.values(), f"R$ {recebimento.valor_total:,.2f}")
+
+class GradeVirtual:
+    """
+    Treeview que só materializa as linhas visíveis. A ordem completa fica em self.ids (ids de
+    cliente, na ordem do repositório); rolar só troca quais ids estão na tela, e os eventos do
+    repositório redesenham apenas as linhas visíveis que mudaram. O iid de cada linha é o id
+    do cliente.
+    """
+    def __init__(self, tree, barra, repositorio, altura=25):
+        self.tree = tree
+        self.barra = barra
+        self.repositorio = repositorio
+        self.altura = altura  # linhas que cabem na tela
+        self.ids = [r.cliente.id for r in repositorio.recebimentos]
+        self.topo = 0
+        self.visiveis = []
+        self.selecionado = None  # sobrevive à linha sair da tela
+
+        barra.configure(command=self.rolar)
+        tree.bind("<Configure>", self._ao_redimensionar)
+        tree.bind("<<TreeviewSelect>>", self._ao_selecionar)
+        tree.bind("<MouseWheel>", lambda e: self.rolar("scroll", -1 if e.delta > 0 else 1, "units"))
+        tree.bind("<Button-4>", lambda e: self.rolar("scroll", -1, "units"))
+        tree.bind("<Button-5>", lambda e: self.rolar("scroll", 1, "units"))
+        tree.bind("<Up>", lambda e: self.mover_selecao(-1))
+        tree.bind("<Down>", lambda e: self.mover_selecao(1))
+        tree.bind("<Prior>", lambda e: self.mover_selecao(-self.altura))
+        tree.bind("<Next>", lambda e: self.mover_selecao(self.altura))
+        repositorio.inscrever(self.ao_mudar)
+
+    def ao_mudar(self, evento, ids):
+        if evento == "adicionados":
+            self.ids.extend(ids)
+            if self.topo + self.altura >= len(self.ids) - len(ids):
+                self.desenhar()
+            else:
+                self._atualizar_barra()
+        elif evento == "alterados":
+            na_tela = set(self.visiveis)
+            for cliente_id in ids:
+                if cliente_id in na_tela:
+                    self.tree.item(str(cliente_id), values=valores_linha(self.repositorio.recebimento(cliente_id)))
+        elif evento == "periodo":
+            for cliente_id in self.visiveis:
+                self.tree.item(str(cliente_id), values=valores_linha(self.repositorio.recebimento(cliente_id)))
+        elif evento == "removidos":
+            if len(ids) == 1:
+                self.ids.remove(ids[0])
+            else:
+                removidos = set(ids)
+                self.ids = [i for i in self.ids if i not in removidos]
+            if self.selecionado in ids:
+                self.selecionado = None
+            self.desenhar()
+
+    def desenhar(self):
+        """Põe na tela a janela [topo, topo + altura), mexendo só nas linhas que entram ou saem."""
+        self.topo = max(0, min(self.topo, len(self.ids) - self.altura))
+        novos = self.ids[self.topo:self.topo + self.altura]
+        if novos != self.visiveis:
+            ficam = set(novos)
+            saem = [str(i) for i in self.visiveis if i not in ficam]
+            if saem:
+                self.tree.delete(*saem)
+            for posicao, cliente_id in enumerate(novos):
+                iid = str(cliente_id)
+                if not self.tree.exists(iid):
+                    self.tree.insert("", posicao, iid=iid, values=valores_linha(self.repositorio.recebimento(cliente_id)))
+                elif self.tree.index(iid) != posicao:
+                    self.tree.move(iid, "", posicao)
+            self.visiveis = novos
+        if self.selecionado is not None and self.tree.exists(str(self.selecionado)):
+            if self.tree.selection() != (str(self.selecionado),):
+                self.tree.selection_set(str(self.selecionado))
+        self._atualizar_barra()
+
+    def recarregar(self):
+        """Refaz a ordem a partir do repositório (as linhas que continuam na tela são mantidas)."""
+        self.ids = [r.cliente.id for r in self.repositorio.recebimentos]
+        self.desenhar()
+
+    def rolar(self, acao, quantidade, unidade=None):
+        # Protocolo do comando da ttk.Scrollbar: ("moveto", fração) ou ("scroll", n, "units"|"pages")
+        if acao == "moveto":
+            self.topo = int(float(quantidade) * len(self.ids))
+        else:
+            self.topo += int(quantidade) * (self.altura if unidade == "pages" else 1)
+        self.desenhar()
+
+    def mostrar(self, cliente_id):
+        """Rola até o cliente e o seleciona."""
+        posicao = self.ids.index(cliente_id)
+        if not self.topo <= posicao < self.topo + self.altura:
+            self.topo = posicao - self.altura // 2
+        self.selecionado = cliente_id
+        self.desenhar()
+        self.tree.see(str(cliente_id))
+
+    def mover_selecao(self, passo):
+        if not self.ids:
+            return "break"
+        posicao = self.ids.index(self.selecionado) + passo if self.selecionado in self.ids else 0
+        self.mostrar(self.ids[max(0, min(posicao, len(self.ids) - 1))])
+        return "break"
+
+    def _atualizar_barra(self):
+        if self.ids:
+            self.barra.set(self.topo / len(self.ids), min(1.0, (self.topo + self.altura) / len(self.ids)))
+        else:
+            self.barra.set(0.0, 1.0)
+
+    def _ao_selecionar(self, event):
+        selecao = self.tree.selection()
+        if selecao:
+            self.selecionado = int(selecao[0])
+
+    def _ao_redimensionar(self, event):
+        estilo = ttk.Style()
+        altura_linha = int(estilo.lookup("Treeview", "rowheight") or 20)
+        altura = max(1, (event.height - altura_linha) // altura_linha)  # menos a linha do cabeçalho
+        if altura != self.altura:
+            self.altura = altura
+            self.desenhar()
+
+def recebimento_selecionado():
+    if grade.selecionado is None:
+        return None
+    return repositorio.recebimento(grade.selecionado)
+
+# Importação de OFX: um leitor em segundo plano lê os arquivos aos pedaços e manda lotes de
+# transações por uma fila; a interface aplica os lotes em fatias curtas via root.after
+OFX_TRANSACAO = re.compile(rb"<STMTTRN>(.*?)</STMTTRN>", re.S | re.I)
+OFX_INICIO_TRANSACAO = re.compile(rb"<STMTTRN>", re.I)
+OFX_CAMPO = re.compile(rb"<(\w+)>([^<\r\n]*)")
+OFX_CONTA = re.compile(rb"<ACCTID>([^<\r\n]*)", re.I)
+OFX_LEITURA = 1 << 20  # bytes lidos por vez
+OFX_LOTE = 500         # transações por mensagem do leitor para a interface
+UI_FATIA_MS = 30       # tempo máximo de cada rodada de atualização da tabela
+
+class TransacaoOFX:
+    __slots__ = ("nome", "valor", "data", "fitid", "conta")
+
+    def __init__(self, nome, valor, data, fitid, conta=None):
+        self.nome = nome
+        self.valor = valor
+        self.data = data
+        self.fitid = fitid
+        self.conta = conta
+
+    @property
+    def transacao_id(self):
+        # O FITID só é único dentro da conta
+        return f"{self.conta or ''}:{self.fitid}" if self.fitid else None
+
+def _encoding_ofx(cabecalho):
+    """OFX 1.x declara CHARSET no cabeçalho SGML; OFX 2.x é XML (UTF-8 se nada disser o contrário)."""
+    cabecalho = cabecalho.upper()
+    if b"CHARSET:1252" in cabecalho or b"CHARSET:WINDOWS-1252" in cabecalho:
+        return "cp1252"
+    if b"ENCODING:UTF-8" in cabecalho or b"<?XML" in cabecalho:
+        return "utf-8"
+    return "cp1252"
+
+def _valor_ofx(texto):
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    return float(texto)
+
+def _conta_ofx(texto, inicio, fim, conta):
+    """Último ACCTID entre inicio e fim (a conta das transações seguintes), ou a conta atual."""
+    for m in OFX_CONTA.finditer(texto, inicio, fim):
+        conta = m.group(1).strip().decode("ascii", "replace")
+    return conta
+
+def _transacao_ofx(bloco, encoding):
+    campos = {tag.upper(): valor for tag, valor in OFX_CAMPO.findall(bloco)}
+    try:
+        postada = campos[b"DTPOSTED"].strip()  # AAAAMMDD[HHMMSS[.XXX]][fuso]
+        data = datetime.date(int(postada[:4]), int(postada[4:6]), int(postada[6:8]))
+        valor = _valor_ofx(campos[b"TRNAMT"].decode("ascii").strip())
+    except (KeyError, ValueError, UnicodeDecodeError):
+        return None
+    nome = campos.get(b"NAME") or campos.get(b"MEMO") or b""
+    fitid = campos.get(b"FITID", b"").decode(encoding, "replace").strip() or None
+    return TransacaoOFX(html.unescape(nome.decode(encoding, "replace").strip()), valor, data, fitid)
+
+def ler_transacoes_ofx(arquivo, progresso=None):
+    """
+    Gera as transações (STMTTRN) de um OFX 1.x (SGML) ou 2.x (XML), de todas as contas do arquivo,
+    lendo OFX_LEITURA bytes por vez. progresso(bytes_lidos) é chamado a cada pedaço.
+    Transações sem data ou valor válidos são ignoradas.
+    """
+    with open(arquivo, "rb") as f:
+        pedaco = f.read(OFX_LEITURA)
+        encoding = _encoding_ofx(pedaco[:1024])
+        lidos = 0
+        resto = b""
+        conta = None
+        while pedaco:
+            lidos += len(pedaco)
+            texto = resto + pedaco
+            fim = 0
+            for m in OFX_TRANSACAO.finditer(texto):
+                conta = _conta_ofx(texto, fim, m.start(), conta)
+                transacao = _transacao_ofx(m.group(1), encoding)
+                if transacao:
+                    transacao.conta = conta
+                    yield transacao
+                fim = m.end()
+            # Guarda só a transação incompleta do fim, ou a partir da última tag (que pode estar cortada)
+            aberta = OFX_INICIO_TRANSACAO.search(texto, fim)
+            corte = aberta.start() if aberta else texto.rfind(b"<", fim)
+            if corte == -1:
+                corte = len(texto)
+            conta = _conta_ofx(texto, fim, corte, conta)
+            resto = texto[corte:]
+            if progresso:
+                progresso(lidos)
+            pedaco = f.read(OFX_LEITURA)
+
+def _ler_arquivos_ofx(arquivos, fila):
+    """Roda na thread do leitor: nada aqui toca o Tk nem o repositório. O "fim" sai sempre, mesmo após um erro."""
+    try:
+        tamanhos = [os.path.getsize(a) if os.path.exists(a) else 0 for a in arquivos]
+        total = sum(tamanhos) or 1
+        anteriores = 0
+        for numero, (arquivo, tamanho) in enumerate(zip(arquivos, tamanhos), 1):
+            lidos = 0
+            rotulo = f"Arquivo {numero}/{len(arquivos)}: {os.path.basename(arquivo)}"
+            lote = []
+
+            def ao_ler(n):
+                nonlocal lidos
+                lidos = n
+
+            try:
+                for transacao in ler_transacoes_ofx(arquivo, progresso=ao_ler):
+                    lote.append(transacao)
+                    if len(lote) >= OFX_LOTE:
+                        fila.put(("lote", lote, (anteriores + lidos) / total, rotulo))
+                        lote = []
+            except Exception as e:
+                # Um OFX malformado não interrompe os outros arquivos
+                fila.put(("erro", f"{os.path.basename(arquivo)}: {e}"))
+            anteriores += tamanho
+            fila.put(("lote", lote, anteriores / total, rotulo))
+    finally:
+        fila.put(("fim",))
+
+class ImportacaoOFX:
+    """Uma importação em andamento: a thread do leitor, a fila de lotes e os totais para o resumo."""
+    def __init__(self, arquivos):
+        self.arquivos = arquivos
+        self.fila = queue.Queue(maxsize=50)  # o leitor espera se a interface ficar para trás
+        self.transacoes = 0
+        self.repetidas = 0
+        self.novos = 0
+        self.erros = []
+        self.concluida = False
+        self.leitor = threading.Thread(target=_ler_arquivos_ofx, args=(arquivos, self.fila), daemon=True)
+
+    def iniciar(self):
+        progresso.configure(value=0)
+        status.configure(text="Importando OFX...")
+        self.leitor.start()
+        root.after(50, self.processar)
+
+    def processar(self):
+        limite = time.perf_counter() + UI_FATIA_MS / 1000
+        # A grade recebe um evento por tipo ao fim da rodada, não um por transação
+        with repositorio.lote():
+            while not self.concluida and time.perf_counter() < limite:
+                try:
+                    mensagem = self.fila.get_nowait()
+                except queue.Empty:
+                    break
+                if mensagem[0] == "lote":
+                    _, lote, fracao, rotulo = mensagem
+                    self.aplicar(lote)
+                    progresso.configure(value=fracao * 100)
+                    status.configure(text=f"{rotulo} - {self.transacoes} transações")
+                elif mensagem[0] == "erro":
+                    self.erros.append(mensagem[1])
+                else:
+                    self.concluida = True
+
+        if self.concluida:
+            self.concluir()
+        else:
+            root.after(1 if not self.fila.empty() else 50, self.processar)
+
+    def aplicar(self, lote):
+        for transacao in lote:
+            cliente = repositorio.cliente_por_nome(transacao.nome)
+            if not cliente:
+                cliente = Cliente(id=repositorio.novo_id(), nome=transacao.nome, endereco="", valor=transacao.valor)
+                repositorio.adicionar(cliente)
+                self.novos += 1
+            # Pagamento no ano e mês da transação; a mesma transação (conta + FITID) entra uma vez só
+            registrado = repositorio.registrar_pagamento(
+                cliente.id, transacao.data.month, ano=transacao.data.year, valor=transacao.valor,
+                transacao_id=transacao.transacao_id, data=transacao.data)
+            if not registrado:
+                self.repetidas += 1
+        self.transacoes += len(lote)
+
+    def concluir(self):
+        global importacao
+        importacao = None
+        progresso.configure(value=100)
+        resumo = (f"{self.transacoes - self.repetidas} transações importadas de {len(self.arquivos)} arquivo(s), "
+                  f"{self.novos} cliente(s) novo(s), {self.repetidas} já registrada(s).")
+        status.configure(text=resumo)
+        if self.erros:
+            messagebox.showwarning("Importar OFX", resumo + "\n\nFalhas:\n" + "\n".join(self.erros))
+
 def importar_ofx():
-    arquivo = filedialog.askopenfilename(filetypes=[("OFX files", "*.ofx")])
-    if not arquivo:
+    global importacao
+    if importacao:
+        messagebox.showinfo("Importar OFX", "Já existe uma importação em andamento.")
         return
-    with open(arquivo) as f:
-        ofx = OfxParser.parse(f)
-    
-    for transacao in ofx.account.statement.transactions:
-        nome_cliente = transacao.payee
-        valor = transacao.amount
-        data = transacao.date
-        
-        cliente_existente = next((c for c in clientes if c.nome == nome_cliente), None)
-        
-        if cliente_existente:
-            recebimento = next((r for r in recebimentos if r.cliente == cliente_existente), None)
-            mes = data.month
-            recebimento.marcar_pagamento(mes)
-        else:
-            cliente = Cliente(id=len(clientes)+1, nome=nome_cliente, endereco="", valor=valor)
-            recebimento = Recebimento(cliente)
-            mes = data.month
-            recebimento.marcar_pagamento(mes)
-            clientes.append(cliente)
-            recebimentos.append(recebimento)
-            pagos = sum(1 for v in recebimento.pagamentos.values() if v == "Pago")
-            valor_total = pagos * cliente.valor
-            tabela.insert("", "end", values=(cliente.nome, f"R$ {cliente.valor:,.2f}", *recebimento.pagamentos.values(), f"R$ {valor_total:,.2f}"))
+    arquivos = filedialog.askopenfilenames(filetypes=[("OFX files", "*.ofx")])
+    if not arquivos:
+        return
+    importacao = ImportacaoOFX(list(arquivos))
+    importacao.iniciar()
 
 def exportar_excel():
     nome_arquivo = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")])
     if not nome_arquivo:
         return
-    dados = []
-    for recebimento in recebimentos:
-        linha = [recebimento.cliente.nome, f"R$ {recebimento.cliente.valor:,.2f}"]
-        linha.extend(recebimento.pagamentos.values())
-        pagos = sum(1 for v in recebimento.pagamentos.values() if v == "Pago")
-        valor_total = pagos * recebimento.cliente.valor
-        linha.append(f"R$ {valor_total:,.2f}")
-        dados.append(linha)
-    
+    dados = [list(valores_linha(recebimento)) for recebimento in recebimentos]
+
     df = pd.DataFrame(dados, columns=colunas)
     df.to_excel(nome_arquivo, engine='openpyxl', index=False)
     messagebox.showinfo("Sucesso", "Dados exportados com sucesso!")
@@ -74,132 +806,188 @@ def cadastrar_cliente():
         endereco = simpledialog.askstring("Cadastro", "Endereço do Cliente:")
         valor = simpledialog.askfloat("Cadastro", "Valor pago pelo Cliente:")
         if valor is not None:
-            cliente = Cliente(id=len(clientes)+1, nome=nome, endereco=endereco, valor=valor)
-            recebimento = Recebimento(cliente)
-            clientes.append(cliente)
-            recebimentos.append(recebimento)
-            tabela.insert("", "end", values=(nome, f"R$ {valor:,.2f}", *recebimento.pagamentos.values(), f"R$ {0:,.2f}"))
+            cliente = Cliente(id=repositorio.novo_id(), nome=nome, endereco=endereco, valor=valor)
+            repositorio.adicionar(cliente)
+            grade.mostrar(cliente.id)
 
 def excluir_cliente():
-    row_id = tabela.selection()[0]
-    index = tabela.index(row_id)
-    tabela.delete(row_id)
-    del clientes[index]
-    del recebimentos[index]
+    recebimento = recebimento_selecionado()
+    if not recebimento:
+        return
+    repositorio.remover(recebimento.cliente)
 
 def excluir_clientes_duplicados():
-    nomes_vistos = set()
-    clientes_unicos = []
-    recebimentos_unicos = []
-    for cliente, recebimento in zip(clientes, recebimentos):
-        if cliente.nome not in nomes_vistos:
-            nomes_vistos.add(cliente.nome)
-            clientes_unicos.append(cliente)
-            recebimentos_unicos.append(recebimento)
-    clientes.clear()
-    clientes.extend(clientes_unicos)
-    recebimentos.clear()
-    recebimentos.extend(recebimentos_unicos)
-    atualizar_tabela()
+    repositorio.remover_duplicados()
 
 def importar_clientes_excel():
     arquivo = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
     if not arquivo:
         return
-    workbook = load_workbook(arquivo)
-    sheet = workbook.active
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        if len(row) != 3:
-            continue
-        nome, endereco, valor = row
-        if valor is None:
-            valor = 0.0
-        cliente = Cliente(id=len(clientes)+1, nome=nome, endereco=endereco, valor=valor)
-        recebimento = Recebimento(cliente)
-        clientes.append(cliente)
-        recebimentos.append(recebimento)
-        pagos = sum(1 for v in recebimento.pagamentos.values() if v == "Pago")
-        valor_total = pagos * cliente.valor
-        tabela.insert("", "end", values=(cliente.nome, f"R$ {cliente.valor:,.2f}", *recebimento.pagamentos.values(), f"R$ {valor_total:,.2f}"))
+    workbook = load_workbook(arquivo, read_only=True)
+    try:
+        sheet = workbook.active
+        with repositorio.lote():
+            for row in sheet.iter_rows(min_row=2, values_only=True):
+                if len(row) != 3:
+                    continue
+                nome, endereco, valor = row
+                if valor is None:
+                    valor = 0.0
+                cliente = Cliente(id=repositorio.novo_id(), nome=nome, endereco=endereco, valor=valor)
+                repositorio.adicionar(cliente)
+    finally:
+        # No modo read_only a planilha fica aberta até o close()
+        workbook.close()
 
 def marcar_como_pago(event):
-    row_id = tabela.selection()[0]
+    recebimento = recebimento_selecionado()
     col_id = tabela.identify_column(event.x)
-    if col_id:
+    if recebimento and col_id:
         mes = int(col_id[1:]) - 2
         if 1 <= mes <= 12:
-            index = tabela.index(row_id)
-            recebimento = recebimentos[index]
-            recebimento.marcar_pagamento(mes)
-            pagos = sum(1 for v in recebimento.pagamentos.values() if v == "Pago")
-            valor_total = pagos * recebimento.cliente.valor
-            tabela.item(row_id, values=(recebimento.cliente.nome, f"R$ {recebimento.cliente.valor:,.2f}", *recebimento.pagamentos.values(), f"R$ {valor_total:,.2f}"))
+            cliente = recebimento.cliente
+            ano = repositorio.livro.ano
+            if not recebimento.pago(mes):
+                repositorio.registrar_pagamento(cliente.id, mes)
+            elif messagebox.askyesno("Remover pagamento", f"Remover os pagamentos de {mes:02d}/{ano} de {cliente.nome}?"):
+                repositorio.remover_pagamentos(cliente.id, ano, mes)
+
+# Os clientes ficam no dados.json; os pagamentos, num arquivo por ano, lido só quando o ano é consultado
+ARQUIVO_DADOS = 'dados.json'
+
+def arquivo_pagamentos(ano):
+    return f"{os.path.splitext(ARQUIVO_DADOS)[0]}_pagamentos_{ano}.json"
+
+def ler_pagamentos_ano(ano):
+    try:
+        with open(arquivo_pagamentos(ano), 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    return [Pagamento(cliente_id, ano, mes, valor, transacao_id, datetime.date.fromisoformat(dia) if dia else None)
+            for cliente_id, mes, valor, transacao_id, dia in data['pagamentos']]
 
 def salvar_dados():
-    with open('dados.json', 'w') as f:
+    livro = repositorio.livro
+    # Anos não alterados (ou nem lidos) já estão certos em disco
+    for ano in sorted(livro.alterados):
+        with open(arquivo_pagamentos(ano), 'w') as f:
+            pagamentos = livro.pagamentos((ano, 1), (ano, 12))
+            json.dump({'ano': ano, 'pagamentos': [p.para_lista() for p in pagamentos]}, f)
+    livro.alterados.clear()
+    with open(ARQUIVO_DADOS, 'w') as f:
         data = {
-            'clientes': [{'id': c.id, 'nome': c.nome, 'endereco': c.endereco, 'valor': c.valor} for c in clientes],
-            'recebimentos': [{'cliente_id': r.cliente.id, 'pagamentos': r.pagamentos} for r in recebimentos]
+            'versao': 2,
+            'ultimo_id': repositorio.ultimo_id,
+            'clientes': [{'id': c.id, 'nome': c.nome, 'endereco': c.endereco, 'valor': c.valor} for c in repositorio.clientes],
+            'anos_pagamentos': livro.anos_com_dados(),
         }
         json.dump(data, f)
 
 def carregar_dados():
     try:
-        with open('dados.json', 'r') as f:
+        with open(ARQUIVO_DADOS, 'r') as f:
             data = json.load(f)
-            for cliente_data in data['clientes']:
-                valor = cliente_data['valor'] if cliente_data['valor'] is not None else 0.0
-                cliente = Cliente(cliente_data['id'], cliente_data['nome'], cliente_data['endereco'], valor)
-                clientes.append(cliente)
-            for recebimento_data in data['recebimentos']:
-                cliente = next(c for c in clientes if c.id == recebimento_data['cliente_id'])
-                recebimento = Recebimento(cliente)
-                recebimento.pagamentos = recebimento_data['pagamentos']
-                recebimentos.append(recebimento)
-                pagos = sum(1 for v in recebimento.pagamentos.values() if v == "Pago")
-                valor_total = pagos * cliente.valor
-                tabela.insert("", "end", values=(cliente.nome, f"R$ {cliente.valor:,.2f}", *recebimento.pagamentos.values(), f"R$ {valor_total:,.2f}"))
     except FileNotFoundError:
-        pass
+        return
+    # Carregar substitui o que está na tela pelo que foi salvo
+    repositorio.limpar()
+    # id salvo -> cliente carregado (o repositório troca o id se ele se repetir no arquivo)
+    carregados = {}
+    with repositorio.lote():
+        for cliente_data in data['clientes']:
+            valor = cliente_data['valor'] if cliente_data['valor'] is not None else 0.0
+            cliente = Cliente(cliente_data['id'], cliente_data['nome'], cliente_data['endereco'], valor)
+            carregados.setdefault(cliente_data['id'], cliente)
+            repositorio.adicionar(cliente)
+        # Ids de clientes excluídos não são reaproveitados: anos ainda em disco podem citá-los
+        repositorio.ultimo_id = max(repositorio.ultimo_id, data.get('ultimo_id', 0))
+        repositorio.livro.usar_disco(data.get('anos_pagamentos', []), ler_pagamentos_ano)
+        # Formato antigo: meses 1-12 sem ano, "Pago"/"Não pago"; entram no ano exibido pelo valor do cliente
+        for recebimento_data in data.get('recebimentos', []):
+            cliente = carregados.get(recebimento_data['cliente_id'])
+            if cliente is None:
+                continue
+            for mes, situacao in recebimento_data['pagamentos'].items():
+                if situacao == PAGO:
+                    repositorio.registrar_pagamento(cliente.id, int(mes))
+    repositorio.exibir_ano(repositorio.livro.ano)
 
 def buscar_cliente():
     nome = simpledialog.askstring("Buscar Cliente", "Nome do Cliente:")
     if nome:
-        for i, cliente in enumerate(clientes):
-            if cliente.nome.lower() == nome.lower():
-                tabela.selection_set(tabela.get_children()[i])
-                tabela.see(tabela.get_children()[i])
-                break
+        encontrados = repositorio.buscar(nome)
+        if encontrados:
+            grade.mostrar(encontrados[0].id)
         else:
             messagebox.showinfo("Info", "Cliente não encontrado.")
 
 def atualizar_cliente():
-    row_id = tabela.selection()[0]
-    index = tabela.index(row_id)
-    cliente = clientes[index]
+    recebimento = recebimento_selecionado()
+    if not recebimento:
+        return
+    cliente = recebimento.cliente
     nome = simpledialog.askstring("Atualizar Cliente", "Nome do Cliente:", initialvalue=cliente.nome)
     endereco = simpledialog.askstring("Atualizar Cliente", "Endereço do Cliente:", initialvalue=cliente.endereco)
     valor = simpledialog.askfloat("Atualizar Cliente", "Valor pago pelo Cliente:", initialvalue=cliente.valor)
     if nome and endereco and valor is not None:
-        cliente.nome = nome
-        cliente.endereco = endereco
-        cliente.valor = valor
-        recebimento = recebimentos[index]
-        pagos = sum(1 for v in recebimento.pagamentos.values() if v == "Pago")
-        valor_total = pagos * cliente.valor
-        tabela.item(row_id, values=(nome, f"R$ {valor:,.2f}", *recebimento.pagamentos.values(), f"R$ {valor_total:,.2f}"))
+        repositorio.atualizar(cliente, nome, endereco, valor)
 
 def atualizar_tabela():
-    for row in tabela.get_children():
-        tabela.delete(row)
-    for recebimento in recebimentos:
-        pagos = sum(1 for v in recebimento.pagamentos.values() if v == "Pago")
-        valor_total = pagos * (recebimento.cliente.valor if recebimento.cliente.valor is not None else 0.0)
-        tabela.insert("", "end", values=(recebimento.cliente.nome, f"R$ {recebimento.cliente.valor:,.2f}", *recebimento.pagamentos.values(), f"R$ {valor_total:,.2f}"))
+    grade.recarregar()
+
+def atualizar_totais(evento=None, ids=None):
+    # Lê os totais em cache da matriz do ano: não depende do número de clientes
+    ano = repositorio.livro.ano
+    matriz = repositorio.livro.matriz(ano)
+    totais.configure(text=f"{ano}: {int(matriz.pagos_mes.sum())} meses pagos | Recebido: R$ {matriz.total():,.2f}")
+
+def trocar_ano(event=None):
+    try:
+        ano = int(ano_exibido.get())
+    except (tk.TclError, ValueError):
+        return
+    if ano != repositorio.livro.ano:
+        repositorio.exibir_ano(ano)
+
+def verificar_recarga():
+    """
+    Autoteste sem interface (python SistemaGEstao.py --verificar): carregar os dados duas vezes
+    e salvar não pode apagar os pagamentos do ano exibido.
+    """
+    global repositorio, ARQUIVO_DADOS
+    arquivo_original = ARQUIVO_DADOS
+    try:
+        with tempfile.TemporaryDirectory() as pasta:
+            ARQUIVO_DADOS = os.path.join(pasta, 'dados.json')
+            repositorio = RepositorioClientes()
+            # Como atualizar_totais: cada evento consulta a matriz do ano exibido
+            repositorio.inscrever(lambda evento, ids: repositorio.livro.matriz(repositorio.livro.ano))
+            cliente = Cliente(None, "Cliente Teste", "", 100.0)
+            repositorio.adicionar(cliente)
+            for mes in (1, 2):
+                repositorio.registrar_pagamento(cliente.id, mes)
+            salvar_dados()
+            carregar_dados()
+            carregar_dados()
+            salvar_dados()
+            carregar_dados()
+            pagos = repositorio.recebimento(cliente.id).pagos
+            assert pagos == 2, f"{pagos} meses pagos depois de carregar duas vezes e salvar (esperado 2)"
+    finally:
+        ARQUIVO_DADOS = arquivo_original
+    print("Carregar duas vezes e salvar: OK")
+
+if __name__ == "__main__" and "--verificar" in sys.argv:
+    verificar_recarga()
+    sys.exit(0)
 
 # Inicialização dos dados e da interface
-clientes = []
-recebimentos = []
+repositorio = RepositorioClientes()
+# Listas na ordem da tabela; alterações passam pelo repositório para manter os índices
+clientes = repositorio.clientes
+recebimentos = repositorio.recebimentos
+importacao = None
 
 root = tk.Tk()
 root.title("Sistema de Gestão de Clientes")
@@ -209,12 +997,15 @@ frame.pack(fill=tk.BOTH, expand=True)
 
 colunas = ["Cliente", "Valor", "Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez", "Total"]
 tabela = ttk.Treeview(frame, columns=colunas, show="headings")
+barra_rolagem = ttk.Scrollbar(frame, orient=tk.VERTICAL)
+barra_rolagem.pack(side=tk.RIGHT, fill=tk.Y)
 tabela.pack(fill=tk.BOTH, expand=True)
 
 for col in colunas:
     tabela.heading(col, text=col)
     tabela.column(col, minwidth=0, width=80, stretch=tk.NO)
 
+grade = GradeVirtual(tabela, barra_rolagem, repositorio)
 tabela.bind("<Double-1>", marcar_como_pago)
 
 botoes_frame = tk.Frame(root)
@@ -231,5 +1022,21 @@ tk.Button(botoes_frame, text="Atualizar Cliente", command=atualizar_cliente).pac
 tk.Button(botoes_frame, text="Salvar Dados", command=salvar_dados).pack(side=tk.LEFT)
 tk.Button(botoes_frame, text="Carregar Dados", command=carregar_dados).pack(side=tk.LEFT)
 
+status_frame = tk.Frame(root)
+status_frame.pack(fill=tk.X)
+tk.Label(status_frame, text="Ano:").pack(side=tk.LEFT, padx=(4, 0))
+ano_exibido = tk.IntVar(value=repositorio.livro.ano)
+seletor_ano = ttk.Spinbox(status_frame, from_=2000, to=2100, width=6, textvariable=ano_exibido, command=trocar_ano)
+seletor_ano.pack(side=tk.LEFT)
+seletor_ano.bind("<Return>", trocar_ano)
+seletor_ano.bind("<FocusOut>", trocar_ano)
+progresso = ttk.Progressbar(status_frame, mode="determinate", maximum=100, length=200)
+progresso.pack(side=tk.LEFT, padx=4, pady=2)
+status = tk.Label(status_frame, text="", anchor="w")
+status.pack(side=tk.LEFT, fill=tk.X, expand=True)
+totais = tk.Label(status_frame, text="", anchor="e")
+totais.pack(side=tk.RIGHT, padx=4)
+repositorio.inscrever(atualizar_totais)
+
 carregar_dados()
 root.mainloop()